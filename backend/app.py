@@ -2,15 +2,35 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
+import os
 import json
+import time
+import uuid
+import asyncio
 from datetime import datetime
 from routes.classify import router as classify_router
+from routes.events import router as events_router
+from routes.shard import router as shard_router
 from risk.whole_detector import get_detector
+from storage.writer import get_event_writer
+from metrics import get_latency_tracker
+from scheduler import get_llm_scheduler, get_provisional_executor, priority_for
 
-# Simple lifespan without database for now
+# Seconds to let in-flight final verdicts finish on shutdown before cancelling them
+SHUTDOWN_GRACE = float(os.getenv("GUARDIAN_SHUTDOWN_GRACE", "30"))
+
+# Start the write-behind event writer with the app and flush it on shutdown
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await event_writer.start()
     yield
+    # Final verdicts still in flight record to the writer, so settle them before it stops
+    if pending_verdicts:
+        _, unfinished = await asyncio.wait(set(pending_verdicts), timeout=SHUTDOWN_GRACE)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+    await event_writer.stop()
 
 app = FastAPI(
     title="Guardian Firewall",
@@ -29,6 +49,8 @@ app.add_middleware(
 
 # Include routers
 app.include_router(classify_router, prefix="/api")
+app.include_router(events_router, prefix="/api")
+app.include_router(shard_router, prefix="/api")
 
 # WebSocket connections
 class ConnectionManager:
@@ -51,39 +73,139 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 guardian_detector = get_detector()
+event_writer = get_event_writer()
+llm_scheduler = get_llm_scheduler()
+provisional_executor = get_provisional_executor()
+
+# /ws messages still being analyzed, drained on shutdown
+pending_verdicts: set = set()
+
+def _risk_update(risk_result, message_id: str, phase: str) -> dict:
+    return {
+        "type": "risk_update",
+        "message_id": message_id,
+        "phase": phase,
+        "level": risk_result.final_level.lower(),
+        "score": risk_result.final_score,
+        "explanations": risk_result.explanations,
+        "action": risk_result.action,
+        "llm_confidence": risk_result.llm_confidence
+    }
+
+def _safety_pause(risk_result, message_id: str, phase: str) -> dict:
+    return {
+        "type": "safety_pause",
+        "message_id": message_id,
+        "phase": phase,
+        "message": "⚠️ High-risk content detected by Guardian AI. Please review before sending.",
+        "explanations": risk_result.explanations,
+        "action": risk_result.action
+    }
+
+async def _send_final_verdict(pending, message_id: str, received_at: float, progressive: bool,
+                              paused: bool, conversation_id, user_id):
+    """Run the LLM phase through the scheduler and broadcast the final verdict"""
+    try:
+        # A reusable near-duplicate verdict never waits for an LLM slot
+        risk_result = await provisional_executor.run(None, guardian_detector.try_reuse, pending)
+        if risk_result is None:
+            risk_result = await llm_scheduler.run(
+                guardian_detector.complete_analysis, pending,
+                priority=priority_for(pending),
+                key=conversation_id or user_id or "anonymous"
+            )
+    except Exception as e:
+        # Never leave a message without a final verdict: fall back to the rules-only
+        # one (keeping any provisional pause in place) and report the failure
+        print(f"Final verdict error for {message_id}: {e}")
+        update = _risk_update(pending.provisional, message_id, "final")
+        update["error"] = f"LLM review failed: {str(e)}"
+        await manager.broadcast(update)
+        return
+
+    elapsed_ms = (time.perf_counter() - received_at) * 1000
+    get_latency_tracker("time_to_final_verdict").record(elapsed_ms)
+    if not progressive:
+        # Non-progressive clients see only this verdict, so it is also their first
+        get_latency_tracker("time_to_first_verdict").record(elapsed_ms)
+
+    # Queue for persistence; flushed in batches off the hot path
+    event_writer.record_verdict(risk_result, conversation_id, user_id, source="ws")
+
+    # Broadcast risk update
+    await manager.broadcast(_risk_update(risk_result, message_id, "final"))
+
+    # Incidents come only from final verdicts
+    if risk_result.final_level == "HIGH":
+        event_writer.record_incident("safety_pause", risk_result, conversation_id, user_id)
+        if not paused:
+            await manager.broadcast(_safety_pause(risk_result, message_id, "final"))
+    elif paused:
+        # The LLM did not confirm the provisional pause; let clients lift it
+        await manager.broadcast({
+            "type": "safety_pause_cleared",
+            "message_id": message_id,
+            "phase": "final",
+            "level": risk_result.final_level.lower(),
+            "action": risk_result.action
+        })
+
+async def _handle_message(message_data: dict, received_at: float, connection_progressive: bool):
+    """Analyze one /ws message and broadcast its verdicts, tagged with its message_id"""
+    message_id = message_data.get("message_id") or uuid.uuid4().hex
+    conversation_id = message_data.get("conversation_id") or message_data.get("room_id")
+    user_id = message_data.get("user_id") or message_data.get("username")
+    progressive = bool(message_data.get("progressive", connection_progressive))
+
+    # Process message through new Guardian detector (rules + local models), off the
+    # event loop and in order within the conversation
+    try:
+        pending = await provisional_executor.run(
+            conversation_id,
+            guardian_detector.analyze_provisional,
+            message_data.get("text", ""),
+            message_data.get("conversation_history", []),
+            conversation_id,
+            message_data.get("username", "Unknown")
+        )
+    except Exception as e:
+        print(f"Provisional verdict error for {message_id}: {e}")
+        await manager.broadcast({"type": "error", "message_id": message_id, "message": f"Analysis failed: {str(e)}"})
+        return
+
+    if not progressive:
+        await _send_final_verdict(pending, message_id, received_at, False, False, conversation_id, user_id)
+        return
+
+    provisional = pending.provisional
+    await manager.broadcast(_risk_update(provisional, message_id, "provisional"))
+    get_latency_tracker("time_to_first_verdict").record((time.perf_counter() - received_at) * 1000)
+
+    paused = provisional.final_level == "HIGH"
+    if paused:
+        await manager.broadcast(_safety_pause(provisional, message_id, "provisional"))
+
+    await _send_final_verdict(pending, message_id, received_at, True, paused, conversation_id, user_id)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+    # Progressive clients (/ws?progressive=1, or "progressive": true on a message) get a
+    # provisional verdict from the patterns and local models right away, then the final
+    # one after the LLM
+    connection_progressive = websocket.query_params.get("progressive", "").lower() in ("1", "true", "yes")
     await manager.connect(websocket)
     try:
         while True:
             data = await websocket.receive_text()
+            received_at = time.perf_counter()
             message_data = json.loads(data)
 
-            # Process message through new Guardian detector
-            risk_result = guardian_detector.analyze_message(
-                message_data.get("text", ""),
-                message_data.get("conversation_history", [])
-            )
-
-            # Broadcast risk update
-            await manager.broadcast({
-                "type": "risk_update",
-                "level": risk_result.final_level.lower(),
-                "score": risk_result.final_score,
-                "explanations": risk_result.explanations,
-                "action": risk_result.action,
-                "llm_confidence": risk_result.llm_confidence
-            })
-
-            # If high risk, trigger safety pause
-            if risk_result.final_level == "HIGH":
-                await manager.broadcast({
-                    "type": "safety_pause",
-                    "message": "⚠️ High-risk content detected by Guardian AI. Please review before sending.",
-                    "explanations": risk_result.explanations,
-                    "action": risk_result.action
-                })
+            # Each message is analyzed in its own task so the next one is read right away:
+            # a dispatcher multiplexes many clients over one connection, and the LLM
+            # scheduler should see all of their messages, not one at a time
+            task = asyncio.create_task(_handle_message(message_data, received_at, connection_progressive))
+            pending_verdicts.add(task)
+            task.add_done_callback(pending_verdicts.discard)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -0,0 +1,15 @@
+import os
+from functools import lru_cache
+from typing import Dict, Any
+import yaml
+
+CONFIG_PATH = os.getenv(
+    "GUARDIAN_CONFIG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "config.yaml")
+)
+
+@lru_cache(maxsize=1)
+def load_config() -> Dict[str, Any]:
+    """Settings from models/config.yaml"""
+    with open(CONFIG_PATH) as f:
+        return yaml.safe_load(f) or {}
@@ -0,0 +1,333 @@
+"""
+Conversation-affinity dispatcher in front of several Guardian shards.
+
+Each shard is a normal `app:app` process (one detector, one set of
+per-conversation windows and caches). The dispatcher hashes every message's
+conversation_id onto a consistent-hash ring and forwards /ws and /api/*
+traffic to the owning shard, so a conversation's state always lives in one
+process. Shards can join and leave at runtime; the dispatcher announces the
+new ring to every shard so they drop state for conversations that moved.
+
+WebSocket traffic uses one shared upstream connection per shard. Shards
+broadcast verdicts to every connection, so the dispatcher fans whatever a
+shard sends out to all of its own clients, the same as a single process.
+
+Ring updates carry GUARDIAN_SHARD_TOKEN; shards refuse them without it, and
+the /api/shard/* routes are never forwarded from clients. Adding or removing
+shards through /shards needs the same token in X-Shard-Token. A shard that
+(re)joins the ring first drops all of its conversation windows.
+
+    GUARDIAN_SHARDS=http://127.0.0.1:8001,http://127.0.0.1:8002 GUARDIAN_SHARD_TOKEN=... uvicorn dispatcher:app --port 8000
+"""
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException, Header
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
+from contextlib import asynccontextmanager
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+import os
+import json
+import uuid
+import secrets
+import asyncio
+import httpx
+import websockets
+import uvicorn
+from sharding import HashRing, shard_key
+
+GUARDIAN_SHARDS = [url.strip().rstrip("/") for url in os.getenv("GUARDIAN_SHARDS", "").split(",") if url.strip()]
+HEALTH_CHECK_INTERVAL = float(os.getenv("SHARD_HEALTH_CHECK_INTERVAL", "5"))
+GUARDIAN_SHARD_TOKEN = os.getenv("GUARDIAN_SHARD_TOKEN", "")
+
+ring = HashRing()
+# Every configured or joined shard, including ones currently failing health checks
+known_shards: set = set()
+client: httpx.AsyncClient = None
+
+# Shared WebSocket upstream per shard, and the dispatcher clients its messages fan out to
+upstreams: dict = {}
+upstream_pumps: dict = {}
+upstream_lock = asyncio.Lock()
+ws_clients: set = set()
+
+async def send_ring(shard: str, shards: list, reset: bool = False) -> bool:
+    """Post ring membership to one shard; reset makes it drop all per-conversation state"""
+    try:
+        response = await client.post(
+            f"{shard}/api/shard/ring",
+            json={"shards": shards, "self_url": shard, "reset": reset},
+            headers={"x-shard-token": GUARDIAN_SHARD_TOKEN}
+        )
+        response.raise_for_status()
+        return True
+    except httpx.HTTPError as e:
+        print(f"⚠️ Warning: Could not announce ring to {shard}: {e}")
+        return False
+
+async def announce_ring():
+    """Tell every live shard the current membership so it can release moved conversations"""
+    shards = ring.shards
+    for shard in shards:
+        await send_ring(shard, shards)
+
+async def join_shard(shard: str) -> bool:
+    """
+    Put a shard on the ring. It first drops every conversation window it still holds:
+    after an outage (or a failed health check) those missed the messages handled elsewhere
+    """
+    known_shards.add(shard)
+    if shard in ring.shards:
+        return True
+    if not await send_ring(shard, ring.shards + [shard], reset=True):
+        return False
+    ring.add(shard)
+    await announce_ring()
+    return True
+
+async def leave_shard(shard: str, forget: bool = False):
+    if forget:
+        known_shards.discard(shard)
+    if shard in ring.shards:
+        ring.remove(shard)
+        await close_upstream(shard)
+        await announce_ring()
+
+async def fan_out(message: str):
+    """Send a shard message to every dispatcher client"""
+    for websocket in list(ws_clients):
+        try:
+            await websocket.send_text(message)
+        except (WebSocketDisconnect, RuntimeError):
+            ws_clients.discard(websocket)
+
+async def pump(shard: str, upstream):
+    """Relay everything a shard sends (verdicts, safety pauses) to the dispatcher clients"""
+    try:
+        async for message in upstream:
+            await fan_out(message)
+    except websockets.ConnectionClosed:
+        pass
+    finally:
+        if upstreams.get(shard) is upstream:
+            del upstreams[shard]
+            upstream_pumps.pop(shard, None)
+
+async def get_upstream(shard: str):
+    """Shared WebSocket connection to a shard, opened on first use"""
+    async with upstream_lock:
+        upstream = upstreams.get(shard)
+        if upstream is None:
+            ws_url = shard.replace("http://", "ws://").replace("https://", "wss://")
+            upstream = await websockets.connect(f"{ws_url}/ws")
+            upstreams[shard] = upstream
+            upstream_pumps[shard] = asyncio.create_task(pump(shard, upstream))
+        return upstream
+
+async def close_upstream(shard: str):
+    upstream = upstreams.pop(shard, None)
+    task = upstream_pumps.pop(shard, None)
+    if task is not None:
+        task.cancel()
+    if upstream is not None:
+        await upstream.close()
+
+async def health_check_loop():
+    """Take failing shards off the ring and put recovered ones back"""
+    while True:
+        for shard in list(known_shards):
+            try:
+                healthy = (await client.get(f"{shard}/health", timeout=2.0)).status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+            if healthy and shard not in ring.shards:
+                if await join_shard(shard):
+                    print(f"✅ Shard {shard} joined")
+            elif not healthy and shard in ring.shards:
+                print(f"⚠️ Warning: Shard {shard} failed health check, rebalancing")
+                await leave_shard(shard)
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client
+    client = httpx.AsyncClient(timeout=60.0, limits=httpx.Limits(max_connections=None))
+    for shard in GUARDIAN_SHARDS:
+        known_shards.add(shard)
+        # Windows left over from a previous dispatcher's ring cannot be trusted
+        if await send_ring(shard, GUARDIAN_SHARDS, reset=True):
+            ring.add(shard)
+    await announce_ring()
+    health_task = asyncio.create_task(health_check_loop())
+    yield
+    health_task.cancel()
+    for shard in list(upstreams):
+        await close_upstream(shard)
+    await client.aclose()
+
+app = FastAPI(
+    title="Guardian Firewall Dispatcher",
+    description="Routes game chat traffic to the shard that owns each conversation",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:3000", "http://localhost:5173"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+class ShardRequest(BaseModel):
+    url: str
+
+@app.get("/shards")
+async def list_shards():
+    return {"active": ring.shards, "known": sorted(known_shards)}
+
+def require_shard_token(x_shard_token: Optional[str]):
+    # Membership decides where chat text is sent, so only holders of the cluster token may change it
+    if not GUARDIAN_SHARD_TOKEN or not secrets.compare_digest(x_shard_token or "", GUARDIAN_SHARD_TOKEN):
+        raise HTTPException(status_code=403, detail="Shard membership changes require X-Shard-Token")
+
+@app.post("/shards")
+async def add_shard(request: ShardRequest, x_shard_token: Optional[str] = Header(None)):
+    """
+    Add a shard to the ring; conversations on its arcs move to it
+    """
+    require_shard_token(x_shard_token)
+    shard = request.url.rstrip("/")
+    known = shard in known_shards
+    if not await join_shard(shard):
+        if not known:
+            known_shards.discard(shard)
+        raise HTTPException(status_code=502, detail=f"Shard {shard} did not accept the ring")
+    return {"active": ring.shards}
+
+@app.delete("/shards")
+async def remove_shard(request: ShardRequest, x_shard_token: Optional[str] = Header(None)):
+    """
+    Remove a shard from the ring; its conversations move to the next shards
+    """
+    require_shard_token(x_shard_token)
+    await leave_shard(request.url.rstrip("/"), forget=True)
+    return {"active": ring.shards}
+
+async def collect_stats(path: str) -> dict:
+    """GET the same stats route from every shard"""
+    stats = {}
+    for shard in ring.shards:
+        try:
+            stats[shard] = (await client.get(f"{shard}/api/{path}")).json()
+        except (httpx.HTTPError, ValueError) as e:
+            stats[shard] = {"error": str(e)}
+    return {"shards": stats}
+
+@app.get("/api/classify/stats")
+async def classify_stats():
+    """
+    Runtime counters from every shard
+    """
+    return await collect_stats("classify/stats")
+
+@app.get("/api/events/stats")
+async def event_stats():
+    """
+    Event writer counters from every shard
+    """
+    return await collect_stats("events/stats")
+
+@app.api_route("/api/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+async def forward(path: str, request: Request):
+    """
+    Forward REST traffic to the shard owning the request's conversation
+    """
+    if path == "shard" or path.startswith("shard/"):
+        # Ring membership is managed by the dispatcher only
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    body = await request.body()
+    key = None
+    if body:
+        try:
+            key = shard_key(json.loads(body))
+        except ValueError:
+            pass
+
+    shard = ring.owner(key)
+    if shard is None:
+        raise HTTPException(status_code=503, detail="No shards available")
+
+    try:
+        upstream = await client.request(
+            request.method,
+            f"{shard}/api/{path}",
+            params=request.query_params,
+            content=body,
+            headers={"content-type": request.headers.get("content-type", "application/json")}
+        )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Shard {shard} unavailable: {str(e)}")
+
+    return Response(
+        content=upstream.content,
+        status_code=upstream.status_code,
+        media_type=upstream.headers.get("content-type")
+    )
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    """
+    Route each client message to the owning shard over its shared upstream
+    """
+    await websocket.accept()
+    # Shared upstreams carry no query string, so the client's mode goes on each message
+    progressive = websocket.query_params.get("progressive", "").lower() in ("1", "true", "yes")
+    ws_clients.add(websocket)
+
+    try:
+        while True:
+            data = await websocket.receive_text()
+            try:
+                message_data = json.loads(data)
+            except ValueError:
+                message_data = None
+
+            key = message_id = None
+            if isinstance(message_data, dict):
+                key = shard_key(message_data)
+                # Verdicts of every client come back over the shared upstream, tagged with this id
+                message_id = message_data.setdefault("message_id", uuid.uuid4().hex)
+                message_data.setdefault("progressive", progressive)
+                data = json.dumps(message_data)
+
+            shard = ring.owner(key)
+            if shard is None:
+                await websocket.send_text(json.dumps({
+                    "type": "error", "message_id": message_id, "message": "No shards available"
+                }))
+                continue
+
+            try:
+                upstream = await get_upstream(shard)
+                await upstream.send(data)
+            except (OSError, websockets.WebSocketException) as e:
+                await close_upstream(shard)
+                await websocket.send_text(json.dumps({
+                    "type": "error", "message_id": message_id, "message": f"Shard {shard} unavailable: {e}"
+                }))
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        ws_clients.discard(websocket)
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "shards": len(ring), "timestamp": datetime.now().isoformat()}
+
+if __name__ == "__main__":
+    uvicorn.run("dispatcher:app", host="0.0.0.0", port=8000)
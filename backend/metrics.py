@@ -0,0 +1,53 @@
+from collections import deque
+from typing import Dict, Any
+
+class LatencyTracker:
+    """
+    Rolling latency statistics in milliseconds.
+
+    Keeps lifetime count/average/max plus percentiles over the most recent
+    samples, so it stays cheap to update on the hot path.
+    """
+
+    def __init__(self, window: int = 1000):
+        self._samples = deque(maxlen=window)
+        self._count = 0
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+
+    def record(self, elapsed_ms: float):
+        self._samples.append(elapsed_ms)
+        self._count += 1
+        self._total_ms += elapsed_ms
+        self._max_ms = max(self._max_ms, elapsed_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "count": self._count,
+            "avg_ms": self._total_ms / self._count if self._count else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": self._max_ms
+        }
+
+# Named global trackers, e.g. "time_to_first_verdict"
+_trackers: Dict[str, LatencyTracker] = {}
+
+def get_latency_tracker(name: str) -> LatencyTracker:
+    """Get or create the global tracker with this name"""
+    tracker = _trackers.get(name)
+    if tracker is None:
+        tracker = _trackers[name] = LatencyTracker()
+    return tracker
+
+def get_latency_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every named tracker"""
+    return {name: tracker.get_stats() for name, tracker in _trackers.items()}
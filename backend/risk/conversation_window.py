@@ -0,0 +1,226 @@
+import os
+import sys
+import math
+import time
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+
+# Largest slice the detector ever reads (expanded Gemini context)
+DEFAULT_WINDOW_CAPACITY = 50
+DEFAULT_MAX_BYTES = int(os.getenv("CONVERSATION_MEMORY_MB", "64")) * 1024 * 1024
+DEFAULT_IDLE_TTL = float(os.getenv("CONVERSATION_IDLE_TTL", "1800"))
+# Risk score of a message whose patterns have not been scored yet
+NOT_SCORED = float("nan")
+
+
+class ConversationWindow:
+    """
+    Fixed-capacity ring buffer of the most recent messages in a conversation.
+
+    Usernames and texts live in two parallel lists that grow up to capacity
+    and are then overwritten in place; timestamps are packed in an int64
+    array and per-message pattern risk scores in a float64 array (NaN until
+    scored). Readers walk the buffer by logical index instead of slicing, so
+    formatting, pattern scans and trend analysis never copy the window.
+    """
+
+    __slots__ = ("capacity", "_usernames", "_texts", "_timestamps", "_risk_scores", "_head", "_text_bytes",
+                 "last_seen")
+
+    def __init__(self, capacity: int = DEFAULT_WINDOW_CAPACITY):
+        self.capacity = capacity
+        self._usernames: List[str] = []
+        self._texts: List[str] = []
+        self._timestamps = array("q")
+        self._risk_scores = array("d")
+        self._head = 0  # physical index of the oldest message once full
+        self._text_bytes = 0
+        self.last_seen = time.monotonic()
+
+    @classmethod
+    def from_history(cls, conversation_history: Optional[List[Dict[str, Any]]],
+                     capacity: int = DEFAULT_WINDOW_CAPACITY) -> "ConversationWindow":
+        """Build a window from the [{"username", "text", "timestamp"}] history format"""
+        window = cls(capacity)
+        if conversation_history:
+            for i in range(max(0, len(conversation_history) - capacity), len(conversation_history)):
+                msg = conversation_history[i]
+                try:
+                    window.append(msg.get("username", "Unknown"), msg.get("text", ""), msg.get("timestamp", 0))
+                except Exception:
+                    continue
+        return window
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def append(self, username: str, text: str, timestamp: int = 0, risk_score: float = NOT_SCORED):
+        """Add a message, overwriting the oldest one when the window is full"""
+        username = sys.intern(str(username))
+        text = str(text)
+        timestamp = int(timestamp)
+
+        if len(self._texts) < self.capacity:
+            self._usernames.append(username)
+            self._texts.append(text)
+            self._timestamps.append(timestamp)
+            self._risk_scores.append(risk_score)
+        else:
+            self._text_bytes -= sys.getsizeof(self._texts[self._head])
+            self._usernames[self._head] = username
+            self._texts[self._head] = text
+            self._timestamps[self._head] = timestamp
+            self._risk_scores[self._head] = risk_score
+            self._head = (self._head + 1) % self.capacity
+        self._text_bytes += sys.getsizeof(text)
+
+    def _indices(self, count: int, skip: int) -> range:
+        """Logical indices (0 = oldest) of `count` messages ending `skip` before the newest"""
+        stop = max(0, len(self._texts) - skip)
+        return range(max(0, stop - count), stop)
+
+    def recent(self, count: int, skip: int = 0) -> Iterator[Tuple[str, str, int]]:
+        """Yield (username, text, timestamp) for up to `count` messages, oldest first"""
+        size = len(self._texts)
+        for i in self._indices(count, skip):
+            j = (self._head + i) % size
+            yield self._usernames[j], self._texts[j], self._timestamps[j]
+
+    def recent_texts(self, count: int, skip: int = 0) -> Iterator[str]:
+        """Yield the text of up to `count` messages, oldest first"""
+        size = len(self._texts)
+        for i in self._indices(count, skip):
+            yield self._texts[(self._head + i) % size]
+
+    def recent_risk_scores(self, count: int, skip: int, score_fn: Callable[[str], float]) -> Iterator[float]:
+        """Yield the pattern risk score of up to `count` messages, scoring and caching unscored ones"""
+        size = len(self._texts)
+        for i in self._indices(count, skip):
+            j = (self._head + i) % size
+            score = self._risk_scores[j]
+            if math.isnan(score):
+                score = self._risk_scores[j] = score_fn(self._texts[j])
+            yield score
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by this window (usernames are interned and shared)"""
+        return (sys.getsizeof(self) + sys.getsizeof(self._usernames) + sys.getsizeof(self._texts)
+                + sys.getsizeof(self._timestamps) + sys.getsizeof(self._risk_scores) + self._text_bytes)
+
+
+class ConversationStore:
+    """
+    Per-conversation windows with a global memory cap.
+
+    Windows are kept in least-recently-used order. Conversations idle for
+    longer than idle_ttl are dropped, and if the tracked total still exceeds
+    max_bytes the least recently used conversations are evicted until it fits.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_WINDOW_CAPACITY, max_bytes: int = DEFAULT_MAX_BYTES,
+                 idle_ttl: float = DEFAULT_IDLE_TTL):
+        self._capacity = capacity
+        self._max_bytes = max_bytes
+        self._idle_ttl = idle_ttl
+        self._windows: "OrderedDict[str, ConversationWindow]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._evicted_idle = 0
+        self._evicted_memory = 0
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def get_or_create(self, conversation_id: str,
+                      conversation_history: Optional[List[Dict[str, Any]]] = None) -> ConversationWindow:
+        """Return the conversation's window, seeding a new one from the client history"""
+        with self._lock:
+            now = time.monotonic()
+            self._evict_idle(now)
+
+            window = self._windows.get(conversation_id)
+            if window is None:
+                window = ConversationWindow.from_history(conversation_history, self._capacity)
+                self._windows[conversation_id] = window
+                self._bytes += window.memory_usage()
+                self._enforce_cap(keep=conversation_id)
+            else:
+                self._windows.move_to_end(conversation_id)
+            window.last_seen = now
+            return window
+
+    def append(self, conversation_id: str, username: str, text: str, timestamp: int = 0,
+               risk_score: float = NOT_SCORED):
+        """Record a message (and its pattern risk score, if known) in the conversation's window"""
+        with self._lock:
+            window = self._windows.get(conversation_id)
+            if window is None:
+                window = ConversationWindow(self._capacity)
+                self._windows[conversation_id] = window
+                self._bytes += window.memory_usage()
+            else:
+                self._windows.move_to_end(conversation_id)
+
+            before = window.memory_usage()
+            window.append(username, text, timestamp, risk_score)
+            self._bytes += window.memory_usage() - before
+            window.last_seen = time.monotonic()
+            self._enforce_cap(keep=conversation_id)
+
+    def discard(self, conversation_id: str):
+        """Forget a conversation"""
+        with self._lock:
+            window = self._windows.pop(conversation_id, None)
+            if window is not None:
+                self._bytes -= window.memory_usage()
+
+    def retain(self, keep: Callable[[str], bool]) -> int:
+        """Forget every conversation for which keep(conversation_id) is false; returns how many"""
+        with self._lock:
+            released = [cid for cid in self._windows if not keep(cid)]
+            for conversation_id in released:
+                self._bytes -= self._windows.pop(conversation_id).memory_usage()
+            return len(released)
+
+    def evict_idle(self) -> int:
+        """Drop conversations idle for longer than idle_ttl; returns how many were dropped"""
+        with self._lock:
+            return self._evict_idle(time.monotonic())
+
+    def _evict_idle(self, now: float) -> int:
+        evicted = 0
+        cutoff = now - self._idle_ttl
+        while self._windows:
+            conversation_id, window = next(iter(self._windows.items()))
+            if window.last_seen >= cutoff:
+                break
+            del self._windows[conversation_id]
+            self._bytes -= window.memory_usage()
+            evicted += 1
+        self._evicted_idle += evicted
+        return evicted
+
+    def _enforce_cap(self, keep: str):
+        while self._bytes > self._max_bytes and len(self._windows) > 1:
+            conversation_id, window = next(iter(self._windows.items()))
+            if conversation_id == keep:
+                break
+            del self._windows[conversation_id]
+            self._bytes -= window.memory_usage()
+            self._evicted_memory += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Tracked conversations, memory use and eviction counters"""
+        conversations = len(self._windows)
+        return {
+            "conversations": conversations,
+            "bytes": self._bytes,
+            "max_bytes": self._max_bytes,
+            "bytes_per_conversation": self._bytes / conversations if conversations else 0.0,
+            "window_capacity": self._capacity,
+            "idle_ttl_seconds": self._idle_ttl,
+            "evicted_idle": self._evicted_idle,
+            "evicted_memory": self._evicted_memory
+        }
@@ -0,0 +1,208 @@
+import os
+import time
+import random
+import threading
+from typing import Dict, Any, Callable, Optional, Tuple, List
+import numpy as np
+
+EMBEDDING_MODEL = os.getenv("VERDICT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+DEFAULT_INDEX_SIZE = int(os.getenv("VERDICT_INDEX_SIZE", "5000"))
+DEFAULT_SIMILARITY = float(os.getenv("VERDICT_REUSE_SIMILARITY", "0.92"))
+DEFAULT_CONTEXT_SIMILARITY = float(os.getenv("VERDICT_REUSE_CONTEXT_SIMILARITY", "0.80"))
+DEFAULT_MIN_WORDS = int(os.getenv("VERDICT_REUSE_MIN_WORDS", "3"))
+# Recent messages embedded as the context signal
+CONTEXT_MESSAGES = 3
+DEFAULT_TTL = float(os.getenv("VERDICT_REUSE_TTL", "3600"))
+DEFAULT_AUDIT_RATE = float(os.getenv("VERDICT_REUSE_AUDIT_RATE", "0.02"))
+
+
+class VerdictMatch:
+    """A stored LLM verdict close enough to reuse"""
+
+    __slots__ = ("llm_risk", "llm_score", "explanation", "similarity")
+
+    def __init__(self, llm_risk: str, llm_score: float, explanation: str, similarity: float):
+        self.llm_risk = llm_risk
+        self.llm_score = llm_score
+        self.explanation = explanation
+        self.similarity = similarity
+
+
+class VerdictIndex:
+    """
+    Index of recent LLM verdicts keyed by sentence embedding.
+
+    Paraphrases such as "send me a pic" / "send me ur pic pls" land within a
+    small cosine radius of each other, so a new message whose nearest stored
+    neighbour is within `similarity` reuses that verdict instead of calling
+    the LLM - provided it was judged in a similar context: the same pattern
+    set and conversation trend, and an embedding of the last few messages
+    within `context_similarity`. Messages shorter than `min_words` ("13",
+    "ok", "sure where?") depend too much on context and are never reused.
+
+    Embeddings live in a fixed-size float32 matrix used as a ring buffer, so
+    the oldest verdicts are evicted first and entries older than `ttl` are
+    ignored. At this size a single matrix-vector product over the normalised
+    rows is exact and well under a millisecond on CPU, so no separate ANN
+    structure is needed. A small fraction of hits (`audit_rate`) still go to
+    the LLM to measure how far reused verdicts drift from fresh ones.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_INDEX_SIZE, similarity: float = DEFAULT_SIMILARITY,
+                 context_similarity: float = DEFAULT_CONTEXT_SIMILARITY, min_words: int = DEFAULT_MIN_WORDS,
+                 ttl: float = DEFAULT_TTL, audit_rate: float = DEFAULT_AUDIT_RATE,
+                 embed_fn: Optional[Callable[[str], np.ndarray]] = None):
+        self._capacity = capacity
+        self._similarity = similarity
+        self._context_similarity = context_similarity
+        self._min_words = min_words
+        self._ttl = ttl
+        self._audit_rate = audit_rate
+        self._embed_fn = embed_fn if embed_fn is not None else self._init_embedder()
+
+        # Allocated on first add, once the dimension is known
+        self._vectors: Optional[np.ndarray] = None
+        self._context_vectors: Optional[np.ndarray] = None
+        self._has_context = np.zeros(capacity, dtype=bool)
+        self._context_keys: List[Optional[Tuple]] = [None] * capacity
+        self._verdicts: List[Optional[Tuple[str, float, str]]] = [None] * capacity
+        self._added_at = np.zeros(capacity, dtype=np.float64)
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self._lookups = 0
+        self._hits = 0
+        self._evictions = 0
+        self._audits = 0
+        self._audit_agreements = 0
+        self._audit_abs_diff = 0.0
+
+    def _init_embedder(self) -> Optional[Callable[[str], np.ndarray]]:
+        """Load a small sentence-embedding model on CPU"""
+        try:
+            import torch
+            from transformers import AutoTokenizer, AutoModel
+
+            tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+            model = AutoModel.from_pretrained(EMBEDDING_MODEL)
+            model.eval()
+
+            def embed(text: str) -> np.ndarray:
+                with torch.no_grad():
+                    inputs = tokenizer([text], padding=True, truncation=True, max_length=128, return_tensors="pt")
+                    hidden = model(**inputs).last_hidden_state
+                    # Mean pooling over real tokens
+                    mask = inputs["attention_mask"].unsqueeze(-1).float()
+                    pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                return pooled[0].numpy().astype(np.float32)
+
+            print("✅ Verdict reuse index initialized successfully")
+            return embed
+        except Exception as e:
+            print(f"⚠️ Warning: Verdict reuse index disabled, embedding model failed to load: {e}")
+            return None
+
+    @property
+    def enabled(self) -> bool:
+        return self._embed_fn is not None
+
+    def accepts(self, message: str) -> bool:
+        """Whether a message is long enough to be looked up or stored"""
+        return self.enabled and len(message.split()) >= self._min_words
+
+    def embed_context(self, recent_texts: List[str]) -> Optional[np.ndarray]:
+        """Embedding of the last few messages before the current one, or None if there are none"""
+        context = "\n".join(recent_texts[-CONTEXT_MESSAGES:])
+        return self.embed(context) if context.strip() else None
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """Unit-length embedding of a message, or None if the index is disabled"""
+        if self._embed_fn is None:
+            return None
+        vector = np.asarray(self._embed_fn(text.strip().lower()), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def search(self, embedding: Optional[np.ndarray], context_embedding: Optional[np.ndarray],
+               context_key: Tuple) -> Optional[VerdictMatch]:
+        """Closest fresh verdict with a matching context within the similarity radius"""
+        if embedding is None:
+            return None
+
+        with self._lock:
+            self._lookups += 1
+            if not self._size:
+                return None
+
+            similarities = self._vectors[:self._size] @ embedding
+            candidates = np.flatnonzero(similarities >= self._similarity)
+            cutoff = time.monotonic() - self._ttl
+            for i in candidates[np.argsort(-similarities[candidates])]:
+                if self._context_keys[i] != context_key or self._added_at[i] < cutoff:
+                    continue
+                if not self._context_matches(i, context_embedding):
+                    continue
+                self._hits += 1
+                llm_risk, llm_score, explanation = self._verdicts[i]
+                return VerdictMatch(llm_risk, llm_score, explanation, float(similarities[i]))
+            return None
+
+    def _context_matches(self, i: int, context_embedding: Optional[np.ndarray]) -> bool:
+        # A conversation opener only matches another opener
+        if context_embedding is None or not self._has_context[i]:
+            return context_embedding is None and not self._has_context[i]
+        return float(self._context_vectors[i] @ context_embedding) >= self._context_similarity
+
+    def add(self, embedding: Optional[np.ndarray], context_embedding: Optional[np.ndarray],
+            context_key: Tuple, llm_risk: str, llm_score: float, explanation: str):
+        """Store an LLM verdict, evicting the oldest one when full"""
+        if embedding is None:
+            return
+
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self._capacity, embedding.shape[0]), dtype=np.float32)
+                self._context_vectors = np.zeros((self._capacity, embedding.shape[0]), dtype=np.float32)
+            if self._size == self._capacity:
+                self._evictions += 1
+
+            i = self._next
+            self._vectors[i] = embedding
+            self._has_context[i] = context_embedding is not None
+            self._context_vectors[i] = context_embedding if context_embedding is not None else 0.0
+            self._context_keys[i] = context_key
+            self._verdicts[i] = (llm_risk, llm_score, explanation)
+            self._added_at[i] = time.monotonic()
+            self._next = (i + 1) % self._capacity
+            self._size = min(self._size + 1, self._capacity)
+
+    def should_audit(self) -> bool:
+        """Whether this hit should also be checked against a fresh LLM verdict"""
+        return random.random() < self._audit_rate
+
+    def record_audit(self, match: VerdictMatch, llm_risk: str, llm_score: float):
+        """Compare a reused verdict with the fresh LLM verdict for the same message"""
+        with self._lock:
+            self._audits += 1
+            self._audit_agreements += int(match.llm_risk == llm_risk)
+            self._audit_abs_diff += abs(match.llm_score - llm_score)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Size, hit rate and accuracy drift of reused verdicts"""
+        return {
+            "enabled": self.enabled,
+            "size": self._size,
+            "capacity": self._capacity,
+            "similarity_threshold": self._similarity,
+            "context_similarity_threshold": self._context_similarity,
+            "min_words": self._min_words,
+            "ttl_seconds": self._ttl,
+            "lookups": self._lookups,
+            "hits": self._hits,
+            "hit_rate": self._hits / self._lookups if self._lookups else 0.0,
+            "evictions": self._evictions,
+            "audits": self._audits,
+            "audit_level_agreement": self._audit_agreements / self._audits if self._audits else None,
+            "audit_mean_abs_score_diff": self._audit_abs_diff / self._audits if self._audits else None
+        }
@@ -1,23 +1,25 @@
 import os
 import json
 import re
-from typing import List, Dict, Any, Tuple
+import time
+from typing import List, Dict, Any, Tuple, Optional, Callable
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
 import torch
+from .conversation_window import ConversationWindow, ConversationStore
+from .verdict_index import VerdictIndex
 
 # Load environment variables
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-class MessageData(BaseModel):
-    username: str
-    text: str
-    timestamp: int
+# Explanations returned when Gemini gives no usable verdict
+LLM_PARSE_FAILED = "Could not parse LLM response"
+LLM_CALL_FAILED = "LLM analysis failed"
 
 class ThreatPattern(BaseModel):
     name: str
@@ -37,6 +39,20 @@ class MessageClassification(BaseModel):
     patterns: List[ThreatPattern]
     conversation_risk_trend: str  # "stable", "escalating", "de-escalating"
 
+class PendingAnalysis(BaseModel):
+    message: str
+    summary_context: List[str]
+    conversation_context: str
+    expanded_conversation_context: Optional[str] = None
+    patterns: List[ThreatPattern]
+    conversation_risk_trend: str
+    provisional: MessageClassification  # verdict without the LLM, sent ahead of the final one
+    # Near-duplicate lookup, filled in by try_reuse before the LLM phase is scheduled
+    reuse_checked: bool = False
+    embedding: Optional[Any] = None
+    context_embedding: Optional[Any] = None
+    reuse_match: Optional[Any] = None
+
 class GuardianDetector:
     def __init__(self):
         """Initialize the Guardian threat detector with Gemini and Hugging Face models"""
@@ -57,6 +73,12 @@ class GuardianDetector:
         # Define comprehensive threat patterns
         self._threat_patterns = self._init_threat_patterns()
 
+        # Per-conversation ring buffers of recent messages
+        self._conversations = ConversationStore()
+
+        # Recent LLM verdicts, reused for near-duplicate messages
+        self._verdict_index = VerdictIndex()
+
         # System prompt for message analysis with conversation context
         self._prompt = ChatPromptTemplate.from_messages([
             ("system",
@@ -188,26 +210,50 @@ class GuardianDetector:
         }
 
 
-    def _format_conversation_context(self, messages: List[MessageData], context_size: int = 15) -> str:
+    def _format_conversation_context(self, messages: ConversationWindow, context_size: int = 15) -> str:
         """Format conversation messages into a readable context with dynamic sizing"""
-        if not messages:
+        if not len(messages):
             return "No previous conversation context."
 
         # Take the specified number of recent messages
-        recent_messages = messages[-context_size:] if len(messages) > context_size else messages
-
-        formatted_lines = []
-        for msg in recent_messages:
-            timestamp_str = f"[{msg.timestamp}]" if hasattr(msg, 'timestamp') else ""
-            formatted_lines.append(f"{timestamp_str} {msg.username}: {msg.text}")
+        return "\n".join(
+            f"[{timestamp}] {username}: {text}"
+            for username, text, timestamp in messages.recent(context_size)
+        )
 
-        return "\n".join(formatted_lines)
+    def _model_signals(self, message: str) -> Tuple[bool, bool]:
+        """Toxicity and NSFW flags for a message, one forward pass per model"""
+        toxic = nsfw = False
+        if self._toxicity_analyzer:
+            try:
+                toxicity_result = self._toxicity_analyzer(message)[0]
+                toxic = toxicity_result['label'] == 'TOXIC' and toxicity_result['score'] > 0.7
+            except Exception:
+                pass
+
+        if self._nsfw_analyzer:
+            try:
+                nsfw_result = self._nsfw_analyzer(message)[0]
+                nsfw = nsfw_result['label'] == 'NSFW' and nsfw_result['score'] > 0.6
+            except Exception:
+                pass
+
+        return toxic, nsfw
+
+    def _score_patterns(self, message: str, conversation_history: ConversationWindow = None) -> Tuple[List[ThreatPattern], float]:
+        """
+        Detect threat patterns in a message and its conversation
 
-    def _detect_patterns(self, message: str, conversation_history: List[MessageData]) -> List[ThreatPattern]:
-        """Detect comprehensive threat patterns in message and conversation"""
+        Also returns the message's own risk score: the summed confidence of the patterns
+        the message triggers without history, which trend analysis caches per message.
+        """
         detected_patterns = []
+        message_risk = 0.0
         message_lower = message.lower()
 
+        # Hugging Face model enhancements, computed once and applied per pattern below
+        toxic, nsfw = self._model_signals(message)
+
         # Rule-based pattern detection
         for pattern_id, pattern_data in self._threat_patterns.items():
             confidence = 0.0
@@ -219,32 +265,22 @@ class GuardianDetector:
                     confidence += 0.4
                     detected_in_current = True
 
+            if toxic and pattern_id in ["secrecy_request", "personal_info"]:
+                confidence += 0.2
+            if nsfw and pattern_id in ["image_request", "meeting_request"]:
+                confidence += 0.3
+
+            if confidence >= 0.3:
+                message_risk += min(confidence, 1.0)
+
             # Check conversation history for escalating patterns
             if conversation_history:
-                recent_messages = conversation_history[-5:]  # Last 5 messages
-                for msg in recent_messages:
-                    msg_lower = msg.text.lower()
+                for text in conversation_history.recent_texts(5):  # Last 5 messages
+                    msg_lower = text.lower()
                     for regex_pattern in pattern_data["patterns"]:
                         if re.search(regex_pattern, msg_lower, re.IGNORECASE):
                             confidence += 0.1
 
-            # Hugging Face model enhancements
-            if self._toxicity_analyzer and pattern_id in ["secrecy_request", "personal_info"]:
-                try:
-                    toxicity_result = self._toxicity_analyzer(message)[0]
-                    if toxicity_result['label'] == 'TOXIC' and toxicity_result['score'] > 0.7:
-                        confidence += 0.2
-                except Exception:
-                    pass
-
-            if self._nsfw_analyzer and pattern_id in ["image_request", "meeting_request"]:
-                try:
-                    nsfw_result = self._nsfw_analyzer(message)[0]
-                    if nsfw_result['label'] == 'NSFW' and nsfw_result['score'] > 0.6:
-                        confidence += 0.3
-                except Exception:
-                    pass
-
             # If pattern detected with sufficient confidence
             if confidence >= 0.3:
                 detected_patterns.append(ThreatPattern(
@@ -254,28 +290,25 @@ class GuardianDetector:
                     detected_in_message=detected_in_current
                 ))
 
-        return detected_patterns
+        return detected_patterns, message_risk
+
+    def _detect_patterns(self, message: str, conversation_history: ConversationWindow = None) -> List[ThreatPattern]:
+        """Detect comprehensive threat patterns in message and conversation"""
+        return self._score_patterns(message, conversation_history)[0]
 
-    def _analyze_conversation_trend(self, conversation_history: List[MessageData], current_patterns: List[ThreatPattern]) -> str:
+    def _message_risk(self, message: str) -> float:
+        """Summed pattern confidence of a message on its own"""
+        return self._score_patterns(message)[1]
+
+    def _analyze_conversation_trend(self, conversation_history: ConversationWindow, current_patterns: List[ThreatPattern]) -> str:
         """Analyze if conversation risk is escalating over time"""
         if len(conversation_history) < 3:
             return "stable"
 
-        # Analyze recent message patterns vs earlier ones
-        recent_messages = conversation_history[-3:]
-        earlier_messages = conversation_history[:-3][-3:] if len(conversation_history) > 3 else []
-
-        recent_risk_score = 0
-        earlier_risk_score = 0
-
-        # Calculate risk scores for message segments
-        for msg in recent_messages:
-            recent_patterns = self._detect_patterns(msg.text, [])
-            recent_risk_score += sum(p.confidence for p in recent_patterns)
-
-        for msg in earlier_messages:
-            earlier_patterns = self._detect_patterns(msg.text, [])
-            earlier_risk_score += sum(p.confidence for p in earlier_patterns)
+        # Recent message patterns (last 3) vs the 3 before them; scores are cached in
+        # the window, so each message is scored (and run through the models) only once
+        recent_risk_score = sum(conversation_history.recent_risk_scores(3, 0, self._message_risk))
+        earlier_risk_score = sum(conversation_history.recent_risk_scores(3, 3, self._message_risk))
 
         # Add current message patterns
         current_risk = sum(p.confidence for p in current_patterns)
@@ -318,11 +351,11 @@ class GuardianDetector:
 
                 return classification, score, explanation
             else:
-                return "MEDIUM", 0.5, "Could not parse LLM response"
+                return "MEDIUM", 0.5, LLM_PARSE_FAILED
 
         except Exception as e:
             print(f"Gemini analysis error: {e}")
-            return "MEDIUM", 0.5, f"LLM analysis failed: {str(e)}"
+            return "MEDIUM", 0.5, f"{LLM_CALL_FAILED}: {str(e)}"
 
 
     def _calculate_final_risk(self, llm_risk: str, llm_score: float, patterns: List[ThreatPattern], conversation_trend: str) -> tuple:
@@ -367,62 +400,10 @@ class GuardianDetector:
 
         return final_level, final_score
 
-    def analyze_message(self, current_message: str, conversation_history: List[Dict[str, Any]] = None) -> MessageClassification:
-        """
-        Analyze a message with dynamic conversation context based on risk level
-
-        Args:
-            current_message: The latest message to analyze
-            conversation_history: List of previous messages with format [{"username": str, "text": str, "timestamp": int}]
-
-        Returns:
-            MessageClassification with risk assessment
-        """
-
-        # Convert conversation history to MessageData objects
-        messages = []
-        if conversation_history:
-            for msg in conversation_history:
-                try:
-                    messages.append(MessageData(
-                        username=msg.get("username", "Unknown"),
-                        text=msg.get("text", ""),
-                        timestamp=msg.get("timestamp", 0)
-                    ))
-                except Exception:
-                    continue
-
-        # Start with default context size of 15
-        initial_context_size = 15
-        conversation_context = self._format_conversation_context(messages, initial_context_size)
-
-        # Detect comprehensive threat patterns
-        patterns = self._detect_patterns(current_message, messages)
-
-        # Analyze conversation trend
-        conversation_trend = self._analyze_conversation_trend(messages, patterns)
-
-        # Analyze with Gemini
-        llm_risk, llm_score, llm_explanation = self._analyze_with_gemini(
-            current_message, conversation_context
-        )
-
-        # If high risk detected or multiple patterns, expand context and re-analyze
-        if (llm_risk == "HIGH" or len(patterns) >= 2) and len(messages) > initial_context_size:
-            # Expand to 50 messages for deeper context analysis
-            expanded_context_size = min(50, len(messages))
-            expanded_conversation_context = self._format_conversation_context(messages, expanded_context_size)
-
-            # Re-analyze with expanded context
-            llm_risk, llm_score, llm_explanation = self._analyze_with_gemini(
-                current_message, expanded_conversation_context
-            )
-
-            # Re-detect patterns with expanded context
-            patterns = self._detect_patterns(current_message, messages[-expanded_context_size:])
-
-            # Add note about expanded analysis
-            llm_explanation += " (Analyzed with expanded conversation history due to high risk/pattern detection)"
+    def _build_classification(self, current_message: str, summary_context: List[str], llm_risk: str,
+                              llm_score: float, llm_explanation: str, patterns: List[ThreatPattern],
+                              conversation_trend: str) -> MessageClassification:
+        """Fuse scores and assemble explanations and action into a MessageClassification"""
 
         # Calculate final risk using Gemini + patterns + conversation trend
         final_level, final_score = self._calculate_final_risk(
@@ -448,10 +429,6 @@ class GuardianDetector:
         }
         action = action_map.get(final_level, "flag")
 
-        # Return summary context (last 10 messages)
-        summary_context_size = min(10, len(messages))
-        summary_context = [msg.text for msg in messages[-summary_context_size:]]
-
         return MessageClassification(
             message=current_message,
             conversation_context=summary_context,
@@ -465,6 +442,186 @@ class GuardianDetector:
             conversation_risk_trend=conversation_trend
         )
 
+    def analyze_provisional(self, current_message: str, conversation_history: List[Dict[str, Any]] = None,
+                            conversation_id: str = None, username: str = "Unknown") -> PendingAnalysis:
+        """
+        First phase of analyze_message: patterns, local models and trend only, no LLM call
+
+        Runs the local models, so callers run it on a worker thread. It reads (and, with
+        a conversation_id, updates) the conversation window, so calls for one conversation
+        must be serialized. The returned PendingAnalysis carries everything
+        complete_analysis needs, so the LLM phase can run on a worker thread.
+        """
+
+        # Ring buffer of recent messages; readers below walk it without copying
+        if conversation_id:
+            messages = self._conversations.get_or_create(conversation_id, conversation_history)
+        else:
+            messages = ConversationWindow.from_history(conversation_history)
+
+        # Start with default context size of 15
+        initial_context_size = 15
+        conversation_context = self._format_conversation_context(messages, initial_context_size)
+
+        # Expanded context (up to 50 messages) in case the LLM flags high risk
+        expanded_conversation_context = None
+        if len(messages) > initial_context_size:
+            expanded_context_size = min(50, len(messages))
+            expanded_conversation_context = self._format_conversation_context(messages, expanded_context_size)
+
+        # Detect comprehensive threat patterns
+        patterns, message_risk = self._score_patterns(current_message, messages)
+
+        # Analyze conversation trend
+        conversation_trend = self._analyze_conversation_trend(messages, patterns)
+
+        # Return summary context (last 10 messages)
+        summary_context = list(messages.recent_texts(10))
+
+        if conversation_id:
+            # Milliseconds, the same unit as client history timestamps (Date.now())
+            self._conversations.append(
+                conversation_id, username, current_message, int(time.time() * 1000), message_risk
+            )
+
+        # Rules and local models only: until the LLM answers, the base score is a prior
+        # from the most severe pattern found in the message itself
+        severity_prior = {"high": 0.5, "medium": 0.25}
+        base_score = max(
+            [severity_prior.get(p.severity, 0.05) for p in patterns if p.detected_in_message],
+            default=0.05
+        )
+        provisional = self._build_classification(
+            current_message, summary_context, "PENDING", base_score,
+            "Provisional verdict from pattern analysis, LLM review pending",
+            patterns, conversation_trend
+        )
+        provisional.llm_confidence = 0.0  # no LLM opinion yet
+
+        # Without the LLM, only rule-only evidence may block: two or more high-severity
+        # patterns, as in _calculate_final_risk. A single regex hit ("zoom in", "first
+        # person") is at most flagged until the final verdict arrives.
+        high_severity_patterns = [p for p in patterns if p.severity == "high"]
+        if provisional.final_level == "HIGH" and len(high_severity_patterns) < 2:
+            provisional.final_level = "MEDIUM"
+            provisional.final_score = min(provisional.final_score, 0.64)
+            provisional.action = "flag"
+
+        return PendingAnalysis(
+            message=current_message,
+            summary_context=summary_context,
+            conversation_context=conversation_context,
+            expanded_conversation_context=expanded_conversation_context,
+            patterns=patterns,
+            conversation_risk_trend=conversation_trend,
+            provisional=provisional
+        )
+
+    def _reuse_context_key(self, pending: PendingAnalysis) -> Tuple:
+        return (pending.conversation_risk_trend, tuple(sorted(p.name for p in pending.patterns)))
+
+    def try_reuse(self, pending: PendingAnalysis) -> Optional[MessageClassification]:
+        """
+        Verdict of a near-duplicate message judged in a similar context, or None if the LLM is needed
+
+        Embedding and search take milliseconds and need no LLM slot, so callers run this on
+        a worker thread before scheduling complete_analysis. Misses and audited hits return
+        None; the lookup is kept on pending so complete_analysis does not repeat it.
+        """
+        pending.reuse_checked = True
+        if self._verdict_index.accepts(pending.message):
+            try:
+                pending.embedding = self._verdict_index.embed(pending.message)
+                pending.context_embedding = self._verdict_index.embed_context(pending.summary_context)
+            except Exception as e:
+                print(f"Verdict index embedding error: {e}")
+                pending.embedding = pending.context_embedding = None
+
+        match = self._verdict_index.search(
+            pending.embedding, pending.context_embedding, self._reuse_context_key(pending)
+        )
+        if match is None or self._verdict_index.should_audit():
+            pending.reuse_match = match
+            return None
+        return self._build_classification(
+            pending.message, pending.summary_context, match.llm_risk, match.llm_score,
+            f"{match.explanation} (Reused verdict of a similar recent message, similarity {match.similarity:.2f})",
+            pending.patterns, pending.conversation_risk_trend
+        )
+
+    def complete_analysis(self, pending: PendingAnalysis) -> MessageClassification:
+        """Second phase of analyze_message: Gemini verdict fused with the provisional signals"""
+
+        # Callers that did not look for a reusable verdict before scheduling do it here
+        if not pending.reuse_checked:
+            reused = self.try_reuse(pending)
+            if reused is not None:
+                return reused
+        match = pending.reuse_match
+
+        # Analyze with Gemini
+        llm_risk, llm_score, llm_explanation = self._analyze_with_gemini(
+            pending.message, pending.conversation_context
+        )
+
+        # If high risk detected or multiple patterns, expand context and re-analyze
+        expanded = (llm_risk == "HIGH" or len(pending.patterns) >= 2) and bool(pending.expanded_conversation_context)
+        if expanded:
+            # Re-analyze with expanded context
+            llm_risk, llm_score, llm_explanation = self._analyze_with_gemini(
+                pending.message, pending.expanded_conversation_context
+            )
+
+        if match is not None:
+            # Audited hit: measure drift of the reused verdict against the fresh one
+            self._verdict_index.record_audit(match, llm_risk, llm_score)
+        elif not llm_explanation.startswith((LLM_PARSE_FAILED, LLM_CALL_FAILED)):
+            # Stored without the expanded-context note, which only applies to this message
+            self._verdict_index.add(
+                pending.embedding, pending.context_embedding, self._reuse_context_key(pending),
+                llm_risk, llm_score, llm_explanation
+            )
+
+        if expanded:
+            # Add note about expanded analysis
+            llm_explanation += " (Analyzed with expanded conversation history due to high risk/pattern detection)"
+
+        return self._build_classification(
+            pending.message, pending.summary_context, llm_risk, llm_score, llm_explanation,
+            pending.patterns, pending.conversation_risk_trend
+        )
+
+    def analyze_message(self, current_message: str, conversation_history: List[Dict[str, Any]] = None,
+                        conversation_id: str = None, username: str = "Unknown") -> MessageClassification:
+        """
+        Analyze a message with dynamic conversation context based on risk level
+
+        Args:
+            current_message: The latest message to analyze
+            conversation_history: List of previous messages with format [{"username": str, "text": str, "timestamp": int}]
+            conversation_id: If given, context comes from the server-side window for this
+                conversation (seeded from conversation_history the first time it is seen),
+                and the current message is appended to it after analysis
+            username: Sender of the current message, recorded in the conversation window
+
+        Returns:
+            MessageClassification with risk assessment
+        """
+        pending = self.analyze_provisional(current_message, conversation_history, conversation_id, username)
+        return self.complete_analysis(pending)
+
+    def get_conversation_stats(self) -> Dict[str, Any]:
+        """Memory use and eviction counters for tracked conversation windows"""
+        return self._conversations.get_stats()
+
+    def release_conversations(self, keep: Callable[[str], bool]) -> int:
+        """Drop per-conversation state for conversations this process no longer owns"""
+        return self._conversations.retain(keep)
+
+    def get_verdict_index_stats(self) -> Dict[str, Any]:
+        """Hit rate and accuracy drift of reused near-duplicate verdicts"""
+        return self._verdict_index.get_stats()
+
 # Global detector instance
 _detector = None
 
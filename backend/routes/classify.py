@@ -5,6 +5,9 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from risk.whole_detector import get_detector
+from storage.writer import get_event_writer
+from metrics import get_latency_stats
+from scheduler import get_llm_scheduler, get_provisional_executor, priority_for, SchedulerFull
 
 router = APIRouter(prefix="/classify", tags=["classification"])
 
@@ -12,6 +15,7 @@ class MessageRequest(BaseModel):
     text: str
     conversation_history: Optional[List[dict]] = []
     user_id: Optional[str] = None
+    conversation_id: Optional[str] = None
 
 class ClassificationResponse(BaseModel):
     risk_level: str
@@ -24,6 +28,9 @@ class ClassificationResponse(BaseModel):
     conversation_risk_trend: str = "stable"
 
 guardian_detector = get_detector()
+event_writer = get_event_writer()
+llm_scheduler = get_llm_scheduler()
+provisional_executor = get_provisional_executor()
 
 @router.post("/message", response_model=ClassificationResponse)
 async def classify_message(request: MessageRequest):
@@ -31,10 +38,29 @@ async def classify_message(request: MessageRequest):
     Classify a single message for grooming risk
     """
     try:
-        result = guardian_detector.analyze_message(
+        pending = await provisional_executor.run(
+            request.conversation_id,
+            guardian_detector.analyze_provisional,
             request.text,
-            request.conversation_history
+            request.conversation_history,
+            request.conversation_id,
+            request.user_id or "Unknown"
         )
+        # A reusable near-duplicate verdict never waits for an LLM slot
+        result = await provisional_executor.run(None, guardian_detector.try_reuse, pending)
+        if result is None:
+            result = await llm_scheduler.run(
+                guardian_detector.complete_analysis, pending,
+                priority=priority_for(pending),
+                key=request.conversation_id or request.user_id or "anonymous"
+            )
+
+        event_writer.record_verdict(
+            result, request.conversation_id, request.user_id, source="classify_message"
+        )
+        if result.final_level == "HIGH":
+            # Clients pause on a high risk_level, as the WS path does with safety_pause
+            event_writer.record_incident("safety_pause", result, request.conversation_id, request.user_id)
 
         return ClassificationResponse(
             risk_level=result.final_level.lower(),
@@ -51,6 +77,8 @@ async def classify_message(request: MessageRequest):
             conversation_risk_trend=result.conversation_risk_trend
         )
 
+    except SchedulerFull as e:
+        raise HTTPException(status_code=503, detail=f"Classification failed: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Classification failed: {str(e)}")
 
@@ -66,7 +94,23 @@ async def classify_conversation(messages: List[dict]):
 
         # Analyze the last message with full conversation context
         last_message = messages[-1].get("text", "")
-        result = guardian_detector.analyze_message(last_message, messages[:-1])
+        conversation_id = messages[-1].get("conversation_id")
+        user_id = messages[-1].get("user_id") or messages[-1].get("username")
+        pending = await provisional_executor.run(
+            None, guardian_detector.analyze_provisional, last_message, messages[:-1]
+        )
+        # A reusable near-duplicate verdict never waits for an LLM slot
+        result = await provisional_executor.run(None, guardian_detector.try_reuse, pending)
+        if result is None:
+            result = await llm_scheduler.run(
+                guardian_detector.complete_analysis, pending,
+                priority=priority_for(pending),
+                key=conversation_id or user_id or "anonymous"
+            )
+
+        event_writer.record_verdict(result, conversation_id, user_id, source="classify_conversation")
+        if result.final_level == "HIGH":
+            event_writer.record_incident("safety_pause", result, conversation_id, user_id)
 
         recent_scores = [result.final_score]
 
@@ -92,5 +136,19 @@ async def classify_conversation(messages: List[dict]):
             "conversation_length": len(messages)
         }
 
+    except SchedulerFull as e:
+        raise HTTPException(status_code=503, detail=f"Conversation analysis failed: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Conversation analysis failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Conversation analysis failed: {str(e)}")
+
+@router.get("/stats")
+async def classifier_stats():
+    """
+    Runtime counters for the detector's per-conversation state
+    """
+    return {
+        "conversations": guardian_detector.get_conversation_stats(),
+        "verdict_reuse": guardian_detector.get_verdict_index_stats(),
+        "latency": get_latency_stats(),
+        "llm_scheduler": llm_scheduler.get_stats()
+    }
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage.writer import get_event_writer
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+event_writer = get_event_writer()
+
+# Query handlers are plain functions so FastAPI runs the blocking
+# database reads in its threadpool instead of on the event loop.
+
+@router.get("/conversation/{conversation_id}")
+def conversation_events(conversation_id: str, limit: int = Query(100, ge=1, le=1000)):
+    """
+    Stored verdicts for a conversation, newest first
+    """
+    try:
+        return {
+            "conversation_id": conversation_id,
+            "events": event_writer.get_events(conversation_id=conversation_id, limit=limit),
+            "incidents": event_writer.get_incidents(conversation_id=conversation_id, limit=limit)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Event lookup failed: {str(e)}")
+
+@router.get("/user/{user_id}")
+def user_events(user_id: str, limit: int = Query(100, ge=1, le=1000)):
+    """
+    Stored verdicts for a user, newest first
+    """
+    try:
+        return {
+            "user_id": user_id,
+            "events": event_writer.get_events(user_id=user_id, limit=limit),
+            "incidents": event_writer.get_incidents(user_id=user_id, limit=limit)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Event lookup failed: {str(e)}")
+
+@router.get("/incidents")
+def incidents(conversation_id: Optional[str] = None, user_id: Optional[str] = None,
+              kind: Optional[str] = None, limit: int = Query(100, ge=1, le=1000)):
+    """
+    Stored incidents (e.g. safety pauses), newest first
+    """
+    try:
+        return {
+            "incidents": event_writer.get_incidents(
+                conversation_id=conversation_id, user_id=user_id, kind=kind, limit=limit
+            )
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Incident lookup failed: {str(e)}")
+
+@router.get("/stats")
+async def persistence_stats():
+    """
+    Write-behind queue depth, batch sizes, flush latency and dropped events
+    """
+    return event_writer.get_stats()
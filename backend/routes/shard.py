@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException, Header
+from pydantic import BaseModel
+from typing import List, Optional
+import sys
+import os
+import secrets
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from risk.whole_detector import get_detector
+from sharding import HashRing
+
+router = APIRouter(prefix="/shard", tags=["sharding"])
+
+class RingUpdate(BaseModel):
+    shards: List[str]
+    self_url: str
+    # Set when this shard (re)joins the ring: windows kept from before may have missed
+    # messages handled elsewhere in the meantime
+    reset: bool = False
+
+guardian_detector = get_detector()
+
+# Shared secret the dispatcher sends with ring updates; without it they are refused
+GUARDIAN_SHARD_TOKEN = os.getenv("GUARDIAN_SHARD_TOKEN")
+
+# Ring as last announced by the dispatcher
+ring_state = {"shards": [], "self_url": None}
+
+@router.post("/ring")
+async def update_ring(update: RingUpdate, x_shard_token: Optional[str] = Header(None)):
+    """
+    Membership change from the dispatcher: drop state for conversations that moved away,
+    or for every conversation when the shard (re)joins
+    """
+    if not GUARDIAN_SHARD_TOKEN or not secrets.compare_digest(x_shard_token or "", GUARDIAN_SHARD_TOKEN):
+        raise HTTPException(status_code=403, detail="Ring updates are only accepted from the dispatcher")
+    if update.self_url not in update.shards:
+        raise HTTPException(status_code=400, detail="self_url must be one of the shards")
+
+    ring = HashRing(update.shards)
+    if update.reset:
+        released = guardian_detector.release_conversations(lambda conversation_id: False)
+    else:
+        released = guardian_detector.release_conversations(
+            lambda conversation_id: ring.owner(conversation_id) == update.self_url
+        )
+    ring_state["shards"] = update.shards
+    ring_state["self_url"] = update.self_url
+    return {"released_conversations": released, **ring_state}
+
+@router.get("/ring")
+async def get_ring():
+    """
+    Ring membership this shard last received
+    """
+    return ring_state
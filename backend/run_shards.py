@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Run a local sharded Guardian cluster: N shard processes plus the dispatcher
+
+    python run_shards.py --shards 4 --port 8000
+
+Shards listen on port+1 .. port+N, the dispatcher on port. All shards write
+to the same database (database.url in models/config.yaml, or DATABASE_URL),
+so the Guardian portal sees every conversation; its tables are created once
+before the shards start. SQLite is fine for a local cluster, but a
+deployment across machines needs a shared database server.
+"""
+
+import os
+import sys
+import time
+import secrets
+import argparse
+import subprocess
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _wait_healthy(url: str, timeout: float = 300.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+def start_cluster(shards: int, port: int = 8000, host: str = "127.0.0.1") -> list:
+    """Start the shard processes and the dispatcher; returns the processes (dispatcher last)"""
+    # Create the tables once here rather than racing N shards through create_all
+    subprocess.run(
+        [sys.executable, "-c", "from storage.writer import create_tables; create_tables()"],
+        cwd=BACKEND_DIR, check=True
+    )
+
+    processes = []
+    shard_urls = []
+    # Shards only accept ring updates carrying this token
+    token_env = dict(os.environ, GUARDIAN_SHARD_TOKEN=os.getenv("GUARDIAN_SHARD_TOKEN") or secrets.token_hex(16))
+    for i in range(1, shards + 1):
+        shard_urls.append(f"http://{host}:{port + i}")
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", host, "--port", str(port + i)],
+            cwd=BACKEND_DIR, env=token_env
+        ))
+
+    for url in shard_urls:
+        if not _wait_healthy(url):
+            stop_cluster(processes)
+            raise RuntimeError(f"Shard {url} did not become healthy")
+
+    env = dict(token_env, GUARDIAN_SHARDS=",".join(shard_urls))
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "dispatcher:app", "--host", host, "--port", str(port)],
+        cwd=BACKEND_DIR, env=env
+    ))
+    if not _wait_healthy(f"http://{host}:{port}"):
+        stop_cluster(processes)
+        raise RuntimeError("Dispatcher did not become healthy")
+    return processes
+
+def stop_cluster(processes: list):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local sharded Guardian cluster")
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    processes = start_cluster(args.shards, args.port, args.host)
+    print(f"🛡️ Dispatcher on http://{args.host}:{args.port} with {args.shards} shards")
+    try:
+        processes[-1].wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_cluster(processes)
+
+if __name__ == "__main__":
+    main()
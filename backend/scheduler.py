@@ -0,0 +1,243 @@
+import os
+import time
+import asyncio
+from collections import deque, OrderedDict
+from typing import Dict, Any, Callable
+from metrics import LatencyTracker
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_WAITING = int(os.getenv("LLM_MAX_WAITING", "256"))
+LLM_MAX_WAITING_PER_KEY = int(os.getenv("LLM_MAX_WAITING_PER_KEY", "16"))
+
+# Highest priority first
+PRIORITY_CLASSES = ("urgent", "elevated", "routine")
+
+
+def priority_for(pending) -> str:
+    """
+    Priority class for a PendingAnalysis.
+
+    Messages where a high-severity pattern fired, or whose conversation is
+    escalating, jump ahead of everything else; any other pattern hit comes
+    next; plain chatter ("gg", "nice shot") goes last.
+    """
+    if pending.conversation_risk_trend == "escalating":
+        return "urgent"
+    if any(p.severity == "high" and p.detected_in_message for p in pending.patterns):
+        return "urgent"
+    if pending.patterns:
+        return "elevated"
+    return "routine"
+
+
+class SchedulerFull(RuntimeError):
+    """Raised when an LLM job is rejected or shed because too many are waiting"""
+
+
+class LLMScheduler:
+    """
+    Bounded-concurrency, priority-aware gate in front of the LLM.
+
+    At most max_concurrency jobs run at once. Waiting jobs are served strictly
+    by priority class, and within a class round-robin across fairness keys
+    (conversation or room), so one busy room cannot take every slot while a
+    quiet room waits.
+
+    The wait queue is bounded too: one key may have at most
+    max_waiting_per_key jobs waiting, and once max_waiting jobs are waiting
+    a new routine job is rejected while a more urgent one sheds the newest
+    routine job of the busiest key. Rejected and shed jobs raise SchedulerFull.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, max_waiting: int = LLM_MAX_WAITING,
+                 max_waiting_per_key: int = LLM_MAX_WAITING_PER_KEY):
+        self._max_concurrency = max_concurrency
+        self._max_waiting = max_waiting
+        self._max_waiting_per_key = max_waiting_per_key
+        self._active = 0
+        self._waiting_by_key: Dict[str, int] = {}
+        # priority class -> fairness key -> waiting futures, keys in round-robin order
+        self._lanes: Dict[str, "OrderedDict[str, deque]"] = {cls: OrderedDict() for cls in PRIORITY_CLASSES}
+        self._waiting = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._completed = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._rejected = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._shed = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._queue_wait = {cls: LatencyTracker() for cls in PRIORITY_CLASSES}
+
+    async def run(self, fn: Callable, *args, priority: str = "routine", key: str = "default"):
+        """Wait for a slot, then run the blocking fn(*args) on a worker thread"""
+        if priority not in self._lanes:
+            priority = "routine"
+
+        enqueued_at = time.perf_counter()
+        await self._acquire(priority, key)
+        self._queue_wait[priority].record((time.perf_counter() - enqueued_at) * 1000)
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, fn, *args)
+        finally:
+            self._completed[priority] += 1
+            self._release()
+
+    async def _acquire(self, priority: str, key: str):
+        if self._active < self._max_concurrency and not any(self._waiting.values()):
+            self._active += 1
+            return
+
+        if self._waiting_by_key.get(key, 0) >= self._max_waiting_per_key:
+            self._rejected[priority] += 1
+            raise SchedulerFull(f"Too many LLM jobs waiting for {key}")
+        if sum(self._waiting.values()) >= self._max_waiting:
+            if priority == "routine" or not self._shed_routine():
+                self._rejected[priority] += 1
+                raise SchedulerFull("LLM queue is full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._lanes[priority].setdefault(key, deque()).append(waiter)
+        self._waiting[priority] += 1
+        self._waiting_by_key[key] = self._waiting_by_key.get(key, 0) + 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Slot was granted just before cancellation; hand it on
+                self._release()
+            else:
+                self._remove_waiter(priority, key, waiter)
+            raise
+
+    def _release(self):
+        self._active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to the next waiters"""
+        while self._active < self._max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._active += 1
+            waiter.set_result(None)
+
+    def _next_waiter(self):
+        for cls in PRIORITY_CLASSES:
+            lanes = self._lanes[cls]
+            if lanes:
+                key, lane = next(iter(lanes.items()))
+                waiter = lane.popleft()
+                self._forget_waiter(cls, key)
+
+                # Rotate this key to the back so the next pick comes from another room
+                del lanes[key]
+                if lane:
+                    lanes[key] = lane
+                return waiter
+        return None
+
+    def _shed_routine(self) -> bool:
+        """Fail the newest routine job of the key with the most routine jobs waiting"""
+        lanes = self._lanes["routine"]
+        if not lanes:
+            return False
+        key = max(lanes, key=lambda k: len(lanes[k]))
+        lane = lanes[key]
+        waiter = lane.pop()
+        if not lane:
+            del lanes[key]
+        self._forget_waiter("routine", key)
+        self._shed["routine"] += 1
+        waiter.set_exception(SchedulerFull("Shed for a higher-priority LLM job"))
+        return True
+
+    def _remove_waiter(self, priority: str, key: str, waiter: asyncio.Future):
+        """Take a cancelled waiter out of its lane right away so counts stay exact"""
+        lane = self._lanes[priority].get(key)
+        if lane is None or waiter not in lane:
+            return
+        lane.remove(waiter)
+        if not lane:
+            del self._lanes[priority][key]
+        self._forget_waiter(priority, key)
+
+    def _forget_waiter(self, priority: str, key: str):
+        self._waiting[priority] -= 1
+        self._waiting_by_key[key] -= 1
+        if not self._waiting_by_key[key]:
+            del self._waiting_by_key[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Slot usage, queue depth and queue wait time by priority class"""
+        return {
+            "max_concurrency": self._max_concurrency,
+            "active": self._active,
+            "max_waiting": self._max_waiting,
+            "max_waiting_per_key": self._max_waiting_per_key,
+            "classes": {
+                cls: {
+                    "waiting": self._waiting[cls],
+                    "waiting_keys": len(self._lanes[cls]),
+                    "completed": self._completed[cls],
+                    "rejected": self._rejected[cls],
+                    "shed": self._shed[cls],
+                    "queue_wait": self._queue_wait[cls].get_stats()
+                } for cls in PRIORITY_CLASSES
+            }
+        }
+
+
+class KeyedExecutor:
+    """
+    Runs blocking calls on worker threads, one at a time per key.
+
+    The provisional phase reads and updates a conversation's window, so the
+    messages of one conversation are analyzed in arrival order (asyncio.Lock
+    is FIFO), while different conversations run in parallel off the event
+    loop. Keyless calls run without a lock.
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._users: Dict[str, int] = {}
+
+    async def run(self, key, fn: Callable, *args):
+        loop = asyncio.get_running_loop()
+        if not key:
+            return await loop.run_in_executor(None, fn, *args)
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                return await loop.run_in_executor(None, fn, *args)
+        finally:
+            # Drop the lock once nobody holds or waits for it
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+# Global scheduler instance
+_scheduler = None
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Get or create the global LLM scheduler instance"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
+
+# Global per-conversation executor for the provisional phase
+_provisional_executor = None
+
+def get_provisional_executor() -> KeyedExecutor:
+    """Get or create the global per-conversation executor instance"""
+    global _provisional_executor
+    if _provisional_executor is None:
+        _provisional_executor = KeyedExecutor()
+    return _provisional_executor
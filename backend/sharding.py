@@ -0,0 +1,76 @@
+import bisect
+import hashlib
+import itertools
+from typing import List, Dict, Iterable, Optional
+
+VIRTUAL_NODES = 128
+
+
+def _hash(value: str) -> int:
+    # Stable across processes and nodes, unlike the built-in hash()
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring mapping conversation ids to shards.
+
+    Each shard is placed on the ring at VIRTUAL_NODES points so keys spread
+    evenly, and when a shard joins or leaves only the keys on its arcs move;
+    every other conversation keeps its owner and its in-memory state.
+    """
+
+    def __init__(self, shards: Iterable[str] = (), virtual_nodes: int = VIRTUAL_NODES):
+        self._virtual_nodes = virtual_nodes
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        self._shards: List[str] = []
+        self._round_robin = itertools.count()
+        for shard in shards:
+            self.add(shard)
+
+    @property
+    def shards(self) -> List[str]:
+        return list(self._shards)
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    def add(self, shard: str):
+        """Place a shard on the ring (no-op if already present)"""
+        if shard in self._shards:
+            return
+        self._shards.append(shard)
+        for i in range(self._virtual_nodes):
+            point = _hash(f"{shard}#{i}")
+            if point in self._owners:
+                continue
+            bisect.insort(self._points, point)
+            self._owners[point] = shard
+
+    def remove(self, shard: str):
+        """Take a shard off the ring; its keys move to the next shards clockwise"""
+        if shard not in self._shards:
+            return
+        self._shards.remove(shard)
+        self._points = [point for point in self._points if self._owners[point] != shard]
+        self._owners = {point: self._owners[point] for point in self._points}
+
+    def owner(self, key: Optional[str]) -> Optional[str]:
+        """Shard owning this key; keyless traffic is spread round-robin"""
+        if not self._shards:
+            return None
+        if not key:
+            return self._shards[next(self._round_robin) % len(self._shards)]
+        i = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[i]]
+
+
+def shard_key(payload) -> Optional[str]:
+    """Affinity key of a /ws message or classify request body"""
+    if isinstance(payload, list):
+        # /api/classify/conversation takes the message list itself
+        payload = payload[-1] if payload else {}
+    if not isinstance(payload, dict):
+        return None
+    return payload.get("conversation_id") or payload.get("room_id") or payload.get("user_id")
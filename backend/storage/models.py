@@ -0,0 +1,72 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import String, Text, Float, Boolean, DateTime, ForeignKey, Index, JSON
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class RiskEvent(Base):
+    """One stored verdict from the Guardian detector"""
+    __tablename__ = "risk_events"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    conversation_id: Mapped[Optional[str]] = mapped_column(String(128))
+    user_id: Mapped[Optional[str]] = mapped_column(String(128))
+    source: Mapped[str] = mapped_column(String(32))  # "ws", "classify_message", "classify_conversation"
+    message: Mapped[str] = mapped_column(Text)
+    llm_risk: Mapped[str] = mapped_column(String(16))
+    llm_confidence: Mapped[float] = mapped_column(Float)
+    final_level: Mapped[str] = mapped_column(String(16))
+    final_score: Mapped[float] = mapped_column(Float)
+    action: Mapped[str] = mapped_column(String(16))
+    conversation_risk_trend: Mapped[str] = mapped_column(String(16))
+    explanations: Mapped[List[str]] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+
+    patterns: Mapped[List["RiskPattern"]] = relationship(
+        back_populates="event", cascade="all, delete-orphan"
+    )
+
+    __table_args__ = (
+        Index("ix_risk_events_conversation_created", "conversation_id", "created_at"),
+        Index("ix_risk_events_user_created", "user_id", "created_at"),
+        Index("ix_risk_events_level_created", "final_level", "created_at"),
+    )
+
+
+class RiskPattern(Base):
+    """A threat pattern that fired for a stored verdict"""
+    __tablename__ = "risk_patterns"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    event_id: Mapped[int] = mapped_column(ForeignKey("risk_events.id", ondelete="CASCADE"), index=True)
+    name: Mapped[str] = mapped_column(String(64), index=True)
+    severity: Mapped[str] = mapped_column(String(16))
+    confidence: Mapped[float] = mapped_column(Float)
+    detected_in_message: Mapped[bool] = mapped_column(Boolean)
+
+    event: Mapped[RiskEvent] = relationship(back_populates="patterns")
+
+
+class Incident(Base):
+    """An intervention raised to the chat, e.g. a safety pause"""
+    __tablename__ = "incidents"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(String(32))  # "safety_pause"
+    conversation_id: Mapped[Optional[str]] = mapped_column(String(128))
+    user_id: Mapped[Optional[str]] = mapped_column(String(128))
+    message: Mapped[str] = mapped_column(Text)
+    final_score: Mapped[float] = mapped_column(Float)
+    action: Mapped[str] = mapped_column(String(16))
+    explanations: Mapped[List[str]] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+
+    __table_args__ = (
+        Index("ix_incidents_conversation_created", "conversation_id", "created_at"),
+        Index("ix_incidents_user_created", "user_id", "created_at"),
+        Index("ix_incidents_kind_created", "kind", "created_at"),
+    )
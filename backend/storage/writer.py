@@ -0,0 +1,327 @@
+import os
+import time
+import asyncio
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker, selectinload
+from .models import Base, RiskEvent, RiskPattern, Incident
+from config import load_config
+
+# DATABASE_URL overrides database.url from models/config.yaml
+DATABASE_URL = os.getenv("DATABASE_URL") or load_config()["database"]["url"]
+
+# Sentinel pushed onto the queue by stop() so the flusher drains and exits
+_STOP = object()
+
+
+def _create_engine(database_url: str):
+    if database_url.startswith("sqlite"):
+        # Shards of a local cluster share one SQLite file; wait for its write lock
+        # instead of failing the batch with "database is locked"
+        return create_engine(database_url, connect_args={"check_same_thread": False, "timeout": 30})
+    return create_engine(database_url)
+
+
+def create_tables(database_url: str = DATABASE_URL):
+    """Create the tables up front, so several processes sharing a database don't race to"""
+    engine = _create_engine(database_url)
+    try:
+        Base.metadata.create_all(engine)
+    finally:
+        engine.dispose()
+
+
+class EventWriter:
+    """
+    Write-behind persistence for verdicts and incidents.
+
+    The detection hot path only snapshots the result into a plain dict and
+    puts it on a bounded in-memory queue. A background task drains the queue
+    and writes batches in a single transaction on a worker thread, so the
+    WebSocket and classify handlers never wait on the database.
+
+    The last incident_reserve queue slots are kept for incidents: routine
+    verdicts are dropped once the queue is that full, so a burst of traffic
+    cannot crowd out safety pauses.
+    """
+
+    def __init__(self, database_url: str = DATABASE_URL, max_queue_size: int = 10000,
+                 batch_size: int = 200, flush_interval: float = 0.5, incident_reserve: int = 1000):
+        self._engine = _create_engine(database_url)
+        self._session_factory = sessionmaker(self._engine, expire_on_commit=False)
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._max_queue_size = max_queue_size
+        self._verdict_limit = max(0, max_queue_size - incident_reserve)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters exposed through get_stats()
+        self._enqueued = 0
+        self._written = 0
+        self._dropped_queue_full = 0
+        self._dropped_incidents = 0
+        self._dropped_write_failed = 0
+        self._batches = 0
+        self._write_errors = 0
+        self._last_batch_size = 0
+        self._max_batch_size = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    async def start(self):
+        """Create tables if needed and start the background flusher"""
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, Base.metadata.create_all, self._engine)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the background flusher"""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    def record_verdict(self, result, conversation_id: Optional[str] = None,
+                       user_id: Optional[str] = None, source: str = "ws") -> bool:
+        """Queue a MessageClassification for persistence. Never blocks."""
+        if self._queue.qsize() >= self._verdict_limit:
+            # Leave the remaining room for incidents
+            self._dropped_queue_full += 1
+            return False
+        return self._enqueue({
+            "type": "verdict",
+            "conversation_id": conversation_id,
+            "user_id": user_id,
+            "source": source,
+            "message": result.message,
+            "llm_risk": result.llm_risk,
+            "llm_confidence": result.llm_confidence,
+            "final_level": result.final_level,
+            "final_score": result.final_score,
+            "action": result.action,
+            "conversation_risk_trend": result.conversation_risk_trend,
+            "explanations": list(result.explanations),
+            "patterns": [{
+                "name": pattern.name,
+                "severity": pattern.severity,
+                "confidence": pattern.confidence,
+                "detected_in_message": pattern.detected_in_message
+            } for pattern in result.patterns],
+            "created_at": datetime.utcnow()
+        })
+
+    def record_incident(self, kind: str, result, conversation_id: Optional[str] = None,
+                        user_id: Optional[str] = None) -> bool:
+        """Queue an intervention (e.g. "safety_pause") for persistence. Never blocks."""
+        return self._enqueue({
+            "type": "incident",
+            "kind": kind,
+            "conversation_id": conversation_id,
+            "user_id": user_id,
+            "message": result.message,
+            "final_score": result.final_score,
+            "action": result.action,
+            "explanations": list(result.explanations),
+            "created_at": datetime.utcnow()
+        })
+
+    def _enqueue(self, item: Dict[str, Any]) -> bool:
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self._dropped_queue_full += 1
+            if item["type"] == "incident":
+                self._dropped_incidents += 1
+            return False
+        self._enqueued += 1
+        return True
+
+    async def _run(self):
+        """Collect items into batches of up to batch_size or flush_interval seconds"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self._flush_interval
+            while len(batch) < self._batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+            if stopping:
+                # Drain whatever was queued behind the sentinel
+                remaining = []
+                while not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if item is not _STOP:
+                        remaining.append(item)
+                for start in range(0, len(remaining), self._batch_size):
+                    await self._flush(remaining[start:start + self._batch_size])
+                return
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            await loop.run_in_executor(None, self._write_batch, batch)
+            self._written += len(batch)
+        except Exception as e:
+            print(f"⚠️ Warning: Failed to persist {len(batch)} events: {e}")
+            self._write_errors += 1
+            self._dropped_write_failed += len(batch)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._batches += 1
+        self._last_batch_size = len(batch)
+        self._max_batch_size = max(self._max_batch_size, len(batch))
+        self._last_flush_ms = elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        """Write one batch in a single transaction (runs on a worker thread)"""
+        with self._session_factory.begin() as session:
+            for item in batch:
+                if item["type"] == "verdict":
+                    event = RiskEvent(
+                        conversation_id=item["conversation_id"],
+                        user_id=item["user_id"],
+                        source=item["source"],
+                        message=item["message"],
+                        llm_risk=item["llm_risk"],
+                        llm_confidence=item["llm_confidence"],
+                        final_level=item["final_level"],
+                        final_score=item["final_score"],
+                        action=item["action"],
+                        conversation_risk_trend=item["conversation_risk_trend"],
+                        explanations=item["explanations"],
+                        created_at=item["created_at"]
+                    )
+                    event.patterns = [RiskPattern(**pattern) for pattern in item["patterns"]]
+                    session.add(event)
+                else:
+                    session.add(Incident(
+                        kind=item["kind"],
+                        conversation_id=item["conversation_id"],
+                        user_id=item["user_id"],
+                        message=item["message"],
+                        final_score=item["final_score"],
+                        action=item["action"],
+                        explanations=item["explanations"],
+                        created_at=item["created_at"]
+                    ))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue, batching and flush-latency counters"""
+        return {
+            "running": self._task is not None,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._max_queue_size,
+            "events_enqueued": self._enqueued,
+            "events_written": self._written,
+            "events_dropped": self._dropped_queue_full + self._dropped_write_failed,
+            "events_dropped_queue_full": self._dropped_queue_full,
+            "incidents_dropped": self._dropped_incidents,
+            "incident_reserve": self._max_queue_size - self._verdict_limit,
+            "events_dropped_write_failed": self._dropped_write_failed,
+            "write_errors": self._write_errors,
+            "batches_flushed": self._batches,
+            "last_batch_size": self._last_batch_size,
+            "max_batch_size": self._max_batch_size,
+            "avg_batch_size": (self._written + self._dropped_write_failed) / self._batches if self._batches else 0.0,
+            "last_flush_ms": self._last_flush_ms,
+            "max_flush_ms": self._max_flush_ms,
+            "avg_flush_ms": self._total_flush_ms / self._batches if self._batches else 0.0
+        }
+
+    def get_events(self, conversation_id: Optional[str] = None, user_id: Optional[str] = None,
+                   limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent stored verdicts for a conversation and/or user"""
+        query = select(RiskEvent).options(selectinload(RiskEvent.patterns))
+        if conversation_id is not None:
+            query = query.where(RiskEvent.conversation_id == conversation_id)
+        if user_id is not None:
+            query = query.where(RiskEvent.user_id == user_id)
+        query = query.order_by(RiskEvent.created_at.desc()).limit(limit)
+
+        with self._session_factory() as session:
+            return [{
+                "id": event.id,
+                "conversation_id": event.conversation_id,
+                "user_id": event.user_id,
+                "source": event.source,
+                "message": event.message,
+                "llm_risk": event.llm_risk,
+                "llm_confidence": event.llm_confidence,
+                "risk_level": event.final_level.lower(),
+                "score": event.final_score,
+                "action": event.action,
+                "conversation_risk_trend": event.conversation_risk_trend,
+                "explanations": event.explanations,
+                "patterns": [{
+                    "name": pattern.name,
+                    "severity": pattern.severity,
+                    "confidence": pattern.confidence,
+                    "detected_in_message": pattern.detected_in_message
+                } for pattern in event.patterns],
+                "created_at": event.created_at.isoformat()
+            } for event in session.scalars(query)]
+
+    def get_incidents(self, conversation_id: Optional[str] = None, user_id: Optional[str] = None,
+                      kind: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent stored incidents, optionally filtered"""
+        query = select(Incident)
+        if conversation_id is not None:
+            query = query.where(Incident.conversation_id == conversation_id)
+        if user_id is not None:
+            query = query.where(Incident.user_id == user_id)
+        if kind is not None:
+            query = query.where(Incident.kind == kind)
+        query = query.order_by(Incident.created_at.desc()).limit(limit)
+
+        with self._session_factory() as session:
+            return [{
+                "id": incident.id,
+                "kind": incident.kind,
+                "conversation_id": incident.conversation_id,
+                "user_id": incident.user_id,
+                "message": incident.message,
+                "score": incident.final_score,
+                "action": incident.action,
+                "explanations": incident.explanations,
+                "created_at": incident.created_at.isoformat()
+            } for incident in session.scalars(query)]
+
+
+# Global writer instance
+_writer = None
+
+def get_event_writer() -> EventWriter:
+    """Get or create the global event writer instance"""
+    global _writer
+    if _writer is None:
+        _writer = EventWriter()
+    return _writer
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for per-conversation state: bytes per tracked conversation
+"""
+
+import sys
+import gc
+import random
+import tracemalloc
+sys.path.append('backend')
+
+from backend.risk.conversation_window import ConversationStore, DEFAULT_WINDOW_CAPACITY
+
+CONVERSATIONS = 5000
+MESSAGES_PER_CONVERSATION = 80
+PLAYERS_PER_ROOM = 4
+
+SAMPLE_TEXTS = [
+    "gg", "nice shot!", "want to team up?", "lol", "you're good at this",
+    "how old are you?", "let's play another round", "send me a pic",
+    "brb", "that was fun", "what rank are you", "add me on discord"
+]
+
+def make_message(room: int, i: int) -> dict:
+    return {
+        "username": f"player_{room % 1000}_{i % PLAYERS_PER_ROOM}",
+        "text": f"{random.choice(SAMPLE_TEXTS)} {i}",
+        "timestamp": 1700000000 + i
+    }
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    state = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+    return current
+
+def build_lists():
+    """Baseline: the raw history dicts, kept as a list per conversation"""
+    rooms = {}
+    for room in range(CONVERSATIONS):
+        history = rooms.setdefault(f"room_{room}", [])
+        for i in range(MESSAGES_PER_CONVERSATION):
+            history.append(make_message(room, i))
+    return rooms
+
+def build_store():
+    store = ConversationStore(max_bytes=1 << 40)
+    for room in range(CONVERSATIONS):
+        for i in range(MESSAGES_PER_CONVERSATION):
+            msg = make_message(room, i)
+            store.append(f"room_{room}", msg["username"], msg["text"], msg["timestamp"])
+    return store
+
+def main():
+    print("🧠 Conversation window memory benchmark")
+    print(f"   {CONVERSATIONS} conversations x {MESSAGES_PER_CONVERSATION} messages "
+          f"(window capacity {DEFAULT_WINDOW_CAPACITY})")
+
+    random.seed(0)
+    list_bytes = measure(build_lists)
+    random.seed(0)
+    store_bytes = measure(build_store)
+
+    print(f"   List of dicts (unbounded): {list_bytes / CONVERSATIONS:,.0f} bytes/conversation")
+    print(f"   Ring buffer windows:       {store_bytes / CONVERSATIONS:,.0f} bytes/conversation")
+
+    random.seed(0)
+    store = build_store()
+    stats = store.get_stats()
+    print(f"   Store accounting:          {stats['bytes_per_conversation']:,.0f} bytes/conversation")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for conversation-affinity sharding: HTTP requests/second and
+/ws messages/second by shard count
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import httpx
+import websockets
+sys.path.append('backend')
+
+from backend.run_shards import start_cluster, stop_cluster
+
+SAMPLE_TEXTS = [
+    "gg", "nice shot!", "want to team up?", "you're good at this",
+    "how old are you?", "let's play another round", "what rank are you"
+]
+
+async def run_load(url: str, requests: int, concurrency: int, conversations: int) -> float:
+    """Fire classify requests spread over many conversations; returns requests/second"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        async def one(i: int):
+            async with semaphore:
+                await client.post(f"{url}/api/classify/message", json={
+                    "text": f"{random.choice(SAMPLE_TEXTS)} {i}",
+                    "conversation_id": f"room_{i % conversations}",
+                    "user_id": f"player_{i % 7}"
+                })
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return requests / (time.perf_counter() - started)
+
+async def run_ws_load(url: str, requests: int, clients: int, conversations: int) -> float:
+    """Send messages over /ws from several clients without waiting in between; returns final verdicts/second"""
+    ws_url = url.replace("http://", "ws://").replace("https://", "wss://") + "/ws"
+    per_client = max(1, requests // clients)
+
+    async def one(c: int):
+        async with websockets.connect(ws_url, max_size=None) as websocket:
+            waiting = set()
+            for i in range(per_client):
+                message_id = f"bench_{c}_{i}"
+                waiting.add(message_id)
+                await websocket.send(json.dumps({
+                    "message_id": message_id,
+                    "text": f"{random.choice(SAMPLE_TEXTS)} {i}",
+                    "conversation_id": f"room_{(c * per_client + i) % conversations}",
+                    "user_id": f"player_{c}"
+                }))
+            # Verdicts are broadcast to every client, so pick out this client's own
+            while waiting:
+                update = json.loads(await websocket.recv())
+                if update.get("type") == "error" and update.get("message_id") in waiting:
+                    waiting.discard(update["message_id"])
+                elif update.get("type") == "risk_update" and update.get("phase") == "final":
+                    waiting.discard(update.get("message_id"))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(c) for c in range(clients)))
+    return clients * per_client / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded Guardian throughput benchmark")
+    parser.add_argument("--shards", default="1,2,4", help="comma-separated shard counts")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--ws-clients", type=int, default=8, help="WebSocket clients for the /ws run")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+
+    print("🛡️ Sharding throughput benchmark")
+    baseline = ws_baseline = None
+    for shards in [int(n) for n in args.shards.split(",")]:
+        processes = start_cluster(shards, args.port)
+        try:
+            url = f"http://127.0.0.1:{args.port}"
+            asyncio.run(run_load(url, args.concurrency, args.concurrency, args.conversations))  # warm up
+            throughput = asyncio.run(run_load(url, args.requests, args.concurrency, args.conversations))
+            ws_throughput = asyncio.run(run_ws_load(url, args.requests, args.ws_clients, args.conversations))
+        finally:
+            stop_cluster(processes)
+
+        # Scaling relative to the per-shard throughput of the first run
+        baseline = baseline or throughput / shards
+        ws_baseline = ws_baseline or ws_throughput / shards
+        print(f"   {shards} shard(s): HTTP {throughput:,.1f} req/s ({throughput / (baseline * shards):.0%} of linear), "
+              f"WS {ws_throughput:,.1f} msg/s ({ws_throughput / (ws_baseline * shards):.0%} of linear)")
+
+if __name__ == "__main__":
+    main()
@@ -108,13 +108,13 @@ class ChatRoom extends Room {
     this.state.messages.set(messageId, chatMessage);
 
     // Real Guardian AI analysis only
-    this.analyzeWithGuardianAI(messageId, messageData.text);
+    this.analyzeWithGuardianAI(messageId, messageData.text, player.username);
   }
 
-  async analyzeWithGuardianAI(messageId, messageText) {
+  async analyzeWithGuardianAI(messageId, messageText, username) {
     try {
       // Get conversation history for context
-      const conversationHistory = this.getConversationHistory();
+      const conversationHistory = this.getConversationHistory(messageId);
 
       // Call Guardian AI backend for real threat analysis
       const response = await fetch('http://localhost:8000/api/classify/message', {
@@ -124,7 +124,9 @@ class ChatRoom extends Room {
         },
         body: JSON.stringify({
           text: messageText,
-          conversation_history: conversationHistory
+          conversation_history: conversationHistory,
+          conversation_id: this.roomId,
+          user_id: username
         })
       });
 
@@ -183,9 +185,10 @@ class ChatRoom extends Room {
     }
   }
 
-  getConversationHistory() {
-    // Get last 15 messages for default sliding window
+  getConversationHistory(excludeId) {
+    // Get last 15 messages for default sliding window (excluding the one being analyzed)
     const messages = Array.from(this.state.messages.values())
+      .filter(msg => msg.id !== excludeId)
       .sort((a, b) => a.timestamp - b.timestamp)
       .slice(-15); // Last 15 messages for default sliding window
 
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-conversation ring buffer and the memory-capped conversation store
+"""
+
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from risk.conversation_window import ConversationWindow, ConversationStore
+
+
+def _store_bytes(store: ConversationStore) -> int:
+    return sum(window.memory_usage() for window in store._windows.values())
+
+
+def test_window_wraparound_keeps_newest_in_order():
+    window = ConversationWindow(capacity=3)
+    for i in range(5):
+        window.append(f"user{i % 2}", f"message {i}", 1000 + i)
+
+    assert len(window) == 3
+    assert list(window.recent(3)) == [
+        ("user0", "message 2", 1002),
+        ("user1", "message 3", 1003),
+        ("user0", "message 4", 1004),
+    ]
+    assert list(window.recent_texts(10)) == ["message 2", "message 3", "message 4"]
+
+
+def test_window_recent_with_skip_after_wraparound():
+    window = ConversationWindow(capacity=4)
+    for i in range(7):
+        window.append("player", f"m{i}", i)
+
+    assert list(window.recent_texts(2, skip=1)) == ["m4", "m5"]
+    assert list(window.recent_texts(10, skip=3)) == ["m3"]
+    assert list(window.recent_texts(2, skip=10)) == []
+
+
+def test_window_byte_accounting_after_overwrite():
+    window = ConversationWindow(capacity=2)
+    window.append("a", "short", 0)
+    window.append("a", "x" * 500, 0)
+    full = window.memory_usage()
+
+    # Overwriting the 500-char text with a short one must give its bytes back
+    window.append("a", "short", 0)
+    window.append("a", "short", 0)
+    assert window.memory_usage() < full
+    assert window._text_bytes == 2 * sys.getsizeof("short")
+
+
+def test_window_caches_risk_scores_across_wraparound():
+    window = ConversationWindow(capacity=3)
+    window.append("a", "seeded", 0)
+    window.append("a", "scored", 0, risk_score=0.4)
+    window.append("a", "also seeded", 0)
+    scored = []
+
+    def score(text):
+        scored.append(text)
+        return 0.1
+
+    assert list(window.recent_risk_scores(3, 0, score)) == [0.1, 0.4, 0.1]
+    assert list(window.recent_risk_scores(3, 0, score)) == [0.1, 0.4, 0.1]
+    assert scored == ["seeded", "also seeded"]
+
+    # Overwriting a slot replaces its cached score
+    window.append("a", "new", 0, risk_score=0.9)
+    assert list(window.recent_risk_scores(3, 0, score)) == [0.4, 0.1, 0.9]
+    assert list(window.recent_risk_scores(2, 1, score)) == [0.4, 0.1]
+
+
+def test_window_from_history_keeps_last_capacity_messages():
+    history = [{"username": f"u{i}", "text": f"t{i}", "timestamp": i} for i in range(10)]
+    window = ConversationWindow.from_history(history, capacity=4)
+
+    assert list(window.recent_texts(4)) == ["t6", "t7", "t8", "t9"]
+    assert [timestamp for _, _, timestamp in window.recent(4)] == [6, 7, 8, 9]
+
+
+def test_store_tracks_bytes_across_append_discard_and_retain():
+    store = ConversationStore(capacity=5, max_bytes=10 ** 9)
+    for i in range(20):
+        store.append(f"room{i % 4}", "player", f"hello {i} " * (i + 1), i)
+    assert store.get_stats()["bytes"] == _store_bytes(store)
+
+    store.discard("room0")
+    assert store.get_stats()["bytes"] == _store_bytes(store)
+
+    released = store.retain(lambda conversation_id: conversation_id == "room1")
+    assert released == 2
+    assert len(store) == 1
+    assert store.get_stats()["bytes"] == _store_bytes(store)
+
+
+def test_store_evicts_least_recently_used_over_memory_cap():
+    probe = ConversationWindow(capacity=5)
+    probe.append("player", "x" * 200, 0)
+    store = ConversationStore(capacity=5, max_bytes=probe.memory_usage() * 3)
+
+    for room in ("room0", "room1", "room2"):
+        store.append(room, "player", "x" * 200, 0)
+    store.get_or_create("room0")  # touch room0 so room1 is least recently used
+    store.append("room3", "player", "x" * 200, 0)
+
+    assert "room1" not in store._windows
+    assert {"room0", "room2", "room3"} == set(store._windows)
+    stats = store.get_stats()
+    assert stats["evicted_memory"] == 1
+    assert stats["bytes"] == _store_bytes(store) <= stats["max_bytes"]
+
+
+def test_store_never_evicts_the_conversation_being_written():
+    store = ConversationStore(capacity=5, max_bytes=1)
+    store.append("room0", "player", "hello", 0)
+    store.append("room1", "player", "hello", 0)
+
+    assert list(store._windows) == ["room1"]
+    assert store.get_stats()["bytes"] == _store_bytes(store)
+
+
+def test_store_evicts_idle_conversations():
+    store = ConversationStore(capacity=5, idle_ttl=60)
+    store.append("stale", "player", "hello", 0)
+    store.append("fresh", "player", "hello", 0)
+    store._windows["stale"].last_seen = time.monotonic() - 120
+
+    assert store.evict_idle() == 1
+    assert list(store._windows) == ["fresh"]
+    assert store.get_stats()["evicted_idle"] == 1
+    assert store.get_stats()["bytes"] == _store_bytes(store)
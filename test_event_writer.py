@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for write-behind persistence of verdicts and incidents
+"""
+
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from storage.writer import EventWriter
+
+
+def _result(message: str = "want to team up?", level: str = "LOW"):
+    return SimpleNamespace(
+        message=message,
+        llm_risk=level,
+        llm_confidence=0.1,
+        final_level=level,
+        final_score=0.1,
+        action="allow",
+        conversation_risk_trend="stable",
+        explanations=["Friendly gaming chat"],
+        patterns=[SimpleNamespace(name="Age inquiry", severity="medium", confidence=0.4, detected_in_message=True)]
+    )
+
+
+def _writer(tmp_path, **kwargs) -> EventWriter:
+    return EventWriter(database_url=f"sqlite:///{tmp_path / 'guardian.db'}", **kwargs)
+
+
+def test_batches_are_written_on_stop(tmp_path):
+    writer = _writer(tmp_path, batch_size=2, flush_interval=5.0)
+
+    async def scenario():
+        await writer.start()
+        for i in range(5):
+            assert writer.record_verdict(_result(f"message {i}"), "room_1", "player_1")
+        await writer.stop()
+
+    asyncio.run(scenario())
+    stats = writer.get_stats()
+    assert stats["events_written"] == 5
+    assert stats["batches_flushed"] == 3
+    assert stats["max_batch_size"] == 2
+    assert not stats["running"]
+
+    events = writer.get_events(conversation_id="room_1")
+    assert sorted(event["message"] for event in events) == [f"message {i}" for i in range(5)]
+    assert events[0]["patterns"][0]["name"] == "Age inquiry"
+
+
+def test_stop_drains_items_queued_behind_the_flusher(tmp_path):
+    writer = _writer(tmp_path, batch_size=3, flush_interval=5.0)
+
+    async def scenario():
+        await writer.start()
+        # Queued without yielding, so the flusher only sees them once stop() is called
+        for i in range(10):
+            writer.record_verdict(_result(f"message {i}"), "room_1", "player_1")
+        writer.record_incident("safety_pause", _result("send me a pic", "HIGH"), "room_1", "player_1")
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert writer.get_stats()["events_written"] == 11
+    assert writer.get_stats()["queue_depth"] == 0
+    assert len(writer.get_events(user_id="player_1")) == 10
+    assert [incident["message"] for incident in writer.get_incidents(kind="safety_pause")] == ["send me a pic"]
+
+
+def test_incident_reserve_keeps_room_for_incidents(tmp_path):
+    writer = _writer(tmp_path, max_queue_size=4, incident_reserve=2)
+
+    async def scenario():
+        # Flusher not started: everything stays queued
+        verdicts = [writer.record_verdict(_result(), "room_1") for _ in range(4)]
+        incidents = [writer.record_incident("safety_pause", _result(level="HIGH"), "room_1") for _ in range(3)]
+        return verdicts, incidents
+
+    verdicts, incidents = asyncio.run(scenario())
+    assert verdicts == [True, True, False, False]
+    assert incidents == [True, True, False]
+
+    stats = writer.get_stats()
+    assert stats["incident_reserve"] == 2
+    assert stats["queue_depth"] == 4
+    assert stats["events_dropped_queue_full"] == 3
+    assert stats["incidents_dropped"] == 1
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Tests for the provisional (rules-only) phase and the final verdict broadcast over /ws
+"""
+
+import os
+import sys
+import asyncio
+import numpy as np
+import pytest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+# The detector module loads Gemini and Hugging Face at import time
+for module in ("torch", "transformers", "dotenv", "langchain_core", "langchain_google_genai"):
+    pytest.importorskip(module)
+
+from risk import whole_detector
+from risk.whole_detector import GuardianDetector
+from risk.conversation_window import ConversationStore
+from risk.verdict_index import VerdictIndex
+
+
+def _rules_only_detector() -> GuardianDetector:
+    """A detector with threat patterns only: no Gemini, local models or verdict index"""
+    detector = GuardianDetector.__new__(GuardianDetector)
+    detector._sentiment_analyzer = detector._toxicity_analyzer = detector._nsfw_analyzer = None
+    detector._threat_patterns = detector._init_threat_patterns()
+    detector._conversations = ConversationStore()
+    detector._verdict_index = VerdictIndex(embed_fn=lambda text: np.ones(4, dtype=np.float32), audit_rate=0.0)
+    return detector
+
+
+# app builds its detector on import; give it the rules-only one
+whole_detector._detector = _rules_only_detector()
+import app
+
+
+def test_single_high_pattern_is_only_flagged_provisionally():
+    pending = _rules_only_detector().analyze_provisional("can you send me a pic")
+    provisional = pending.provisional
+
+    assert [p.name for p in pending.patterns] == ["Image request"]
+    assert provisional.final_level == "MEDIUM"
+    assert provisional.action == "flag"
+    assert provisional.final_score <= 0.64
+    assert provisional.llm_confidence == 0.0
+
+
+def test_two_high_patterns_block_provisionally():
+    provisional = _rules_only_detector().analyze_provisional("send me a pic and add me on discord").provisional
+
+    assert provisional.final_level == "HIGH"
+    assert provisional.action == "block"
+
+
+def test_message_models_run_once_per_message():
+    detector = _rules_only_detector()
+    calls = []
+    model_signals = detector._model_signals
+    detector._model_signals = lambda text: calls.append(text) or model_signals(text)
+
+    for i in range(8):
+        detector.analyze_provisional(f"how old are you {i}", conversation_id="room_1", username="player")
+    # History scores come from the window cache instead of re-running the models
+    assert calls == [f"how old are you {i}" for i in range(8)]
+
+
+def test_reusable_verdict_is_found_before_the_llm_phase():
+    detector = _rules_only_detector()
+    pending = detector.analyze_provisional("can you send me a pic")
+    assert detector.try_reuse(pending) is None
+    assert pending.reuse_checked
+
+    # No Gemini client on this detector: the LLM phase fails, and the lookup is not repeated
+    result = detector.complete_analysis(pending)
+    assert result.explanations[0].startswith(whole_detector.LLM_CALL_FAILED)
+    assert detector.get_verdict_index_stats()["lookups"] == 1
+
+    detector._verdict_index.add(pending.embedding, pending.context_embedding,
+                                detector._reuse_context_key(pending), "HIGH", 0.9, "Image request")
+    reused = detector.try_reuse(detector.analyze_provisional("can you send me a pic"))
+    assert reused is not None
+    assert reused.llm_confidence == 0.9
+    assert "Reused verdict" in reused.explanations[0]
+
+
+class _Recorder:
+    def __init__(self):
+        self.broadcasts = []
+        self.verdicts = []
+        self.incidents = []
+
+    async def broadcast(self, message: dict):
+        self.broadcasts.append(message)
+
+    def record_verdict(self, result, *args, **kwargs):
+        self.verdicts.append(result)
+
+    def record_incident(self, kind, result, *args, **kwargs):
+        self.incidents.append((kind, result))
+
+
+def _final_verdict(monkeypatch, message: str, final_level: str, paused: bool, error: Exception = None) -> _Recorder:
+    detector = _rules_only_detector()
+    pending = detector.analyze_provisional(message)
+    final = pending.provisional.model_copy(update={
+        "final_level": final_level, "action": {"LOW": "allow", "HIGH": "block"}[final_level]
+    })
+
+    def complete_analysis(_pending):
+        if error is not None:
+            raise error
+        return final
+
+    recorder = _Recorder()
+    monkeypatch.setattr(app, "manager", recorder)
+    monkeypatch.setattr(app, "event_writer", recorder)
+    monkeypatch.setattr(app.guardian_detector, "complete_analysis", complete_analysis)
+    asyncio.run(app._send_final_verdict(pending, "m1", 0.0, True, paused, "room_1", "player_1"))
+    return recorder
+
+
+def test_unconfirmed_provisional_pause_is_cleared(monkeypatch):
+    recorder = _final_verdict(monkeypatch, "send me a pic and add me on discord", "LOW", paused=True)
+
+    assert [m["type"] for m in recorder.broadcasts] == ["risk_update", "safety_pause_cleared"]
+    assert recorder.broadcasts[0]["phase"] == "final"
+    assert recorder.broadcasts[1]["message_id"] == "m1"
+    assert recorder.incidents == []
+
+
+def test_high_final_verdict_pauses_and_records_incident(monkeypatch):
+    recorder = _final_verdict(monkeypatch, "can you send me a pic", "HIGH", paused=False)
+
+    assert [m["type"] for m in recorder.broadcasts] == ["risk_update", "safety_pause"]
+    assert [kind for kind, _ in recorder.incidents] == ["safety_pause"]
+
+
+def test_failed_llm_phase_still_sends_a_final_verdict(monkeypatch):
+    recorder = _final_verdict(monkeypatch, "can you send me a pic", "LOW", paused=False,
+                              error=RuntimeError("quota exceeded"))
+
+    assert len(recorder.broadcasts) == 1
+    assert recorder.broadcasts[0]["phase"] == "final"
+    assert "quota exceeded" in recorder.broadcasts[0]["error"]
+    assert recorder.verdicts == recorder.incidents == []
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Tests for the priority-aware, round-robin LLM scheduler
+"""
+
+import os
+import sys
+import asyncio
+import threading
+import pytest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from scheduler import LLMScheduler, KeyedExecutor, SchedulerFull
+
+
+async def _hold_slot(scheduler: LLMScheduler, order: list):
+    """Occupy the scheduler's only slot until the returned event is set"""
+    gate = threading.Event()
+
+    def blocker():
+        gate.wait(5)
+        order.append("blocker")
+
+    task = asyncio.create_task(scheduler.run(blocker, key="blocker"))
+    await asyncio.sleep(0.01)
+    return gate, task
+
+
+def test_priority_classes_then_round_robin_across_keys():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        order = []
+        gate, blocker = await _hold_slot(scheduler, order)
+
+        jobs = [
+            ("a1", "routine", "room_a"),
+            ("a2", "routine", "room_a"),
+            ("a3", "routine", "room_a"),
+            ("b1", "routine", "room_b"),
+            ("c1", "urgent", "room_c"),
+            ("a4", "elevated", "room_a"),
+        ]
+        tasks = [asyncio.create_task(scheduler.run(order.append, name, priority=priority, key=key))
+                 for name, priority, key in jobs]
+        await asyncio.sleep(0.01)
+        assert scheduler.get_stats()["classes"]["routine"]["waiting"] == 4
+
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    # Urgent first, then elevated, then routine alternating between rooms
+    assert asyncio.run(scenario()) == ["blocker", "c1", "a4", "a1", "b1", "a2", "a3"]
+
+
+def test_cancelled_waiter_is_removed_immediately():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1)
+        order = []
+        gate, blocker = await _hold_slot(scheduler, order)
+
+        cancelled = asyncio.create_task(scheduler.run(order.append, "cancelled", key="room_a"))
+        kept = asyncio.create_task(scheduler.run(order.append, "kept", key="room_b"))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        await asyncio.sleep(0.01)
+
+        routine = scheduler.get_stats()["classes"]["routine"]
+        assert routine["waiting"] == 1
+        assert routine["waiting_keys"] == 1
+        assert "room_a" not in scheduler._waiting_by_key
+
+        gate.set()
+        await asyncio.gather(blocker, kept)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert scheduler.get_stats()["active"] == 0
+        return order
+
+    assert asyncio.run(scenario()) == ["blocker", "kept"]
+
+
+def test_per_key_waiting_limit_rejects():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_waiting_per_key=1)
+        order = []
+        gate, blocker = await _hold_slot(scheduler, order)
+
+        first = asyncio.create_task(scheduler.run(order.append, "first", key="room_a"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(SchedulerFull):
+            await scheduler.run(order.append, "second", key="room_a")
+
+        gate.set()
+        await asyncio.gather(blocker, first)
+        assert scheduler.get_stats()["classes"]["routine"]["rejected"] == 1
+        return order
+
+    assert asyncio.run(scenario()) == ["blocker", "first"]
+
+
+def test_full_queue_rejects_routine_and_sheds_for_urgent():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_waiting=2)
+        order = []
+        gate, blocker = await _hold_slot(scheduler, order)
+
+        older = asyncio.create_task(scheduler.run(order.append, "older", key="room_a"))
+        newer = asyncio.create_task(scheduler.run(order.append, "newer", key="room_a"))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(SchedulerFull):
+            await scheduler.run(order.append, "routine", key="room_b")
+
+        urgent = asyncio.create_task(scheduler.run(order.append, "urgent", priority="urgent", key="room_b"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(SchedulerFull):
+            await newer
+
+        gate.set()
+        await asyncio.gather(blocker, older, urgent)
+        classes = scheduler.get_stats()["classes"]
+        assert classes["routine"]["rejected"] == 1
+        assert classes["routine"]["shed"] == 1
+        assert classes["routine"]["waiting"] == classes["urgent"]["waiting"] == 0
+        return order
+
+    assert asyncio.run(scenario()) == ["blocker", "urgent", "older"]
+
+
+def test_keyed_executor_serializes_per_key_in_arrival_order():
+    async def scenario():
+        executor = KeyedExecutor()
+        running = {"room_a": 0, "room_b": 0}
+        overlaps = []
+        order = []
+        lock = threading.Lock()
+
+        def job(key, name):
+            with lock:
+                running[key] += 1
+                overlaps.append(running[key])
+            threading.Event().wait(0.01)
+            with lock:
+                order.append(name)
+                running[key] -= 1
+
+        jobs = [executor.run(key, job, key, f"{key}{i}") for i in range(4) for key in ("room_a", "room_b")]
+        await asyncio.gather(*jobs)
+        assert max(overlaps) == 1
+        assert len(executor) == 0  # locks are dropped once idle
+        return order
+
+    order = asyncio.run(scenario())
+    assert [name for name in order if name.startswith("room_a")] == [f"room_a{i}" for i in range(4)]
+    assert [name for name in order if name.startswith("room_b")] == [f"room_b{i}" for i in range(4)]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for the consistent-hash ring behind the shard dispatcher
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from sharding import HashRing, shard_key
+
+SHARDS = [f"http://127.0.0.1:{8001 + i}" for i in range(4)]
+KEYS = [f"room_{i}" for i in range(5000)]
+
+
+def _owners(ring: HashRing) -> dict:
+    return {key: ring.owner(key) for key in KEYS}
+
+
+def test_owner_is_stable_across_ring_instances():
+    # Shards compute ownership from their own ring copy, so it must not depend on insertion order
+    assert _owners(HashRing(SHARDS)) == _owners(HashRing(reversed(SHARDS)))
+
+
+def test_keys_spread_over_all_shards():
+    counts = {}
+    for owner in _owners(HashRing(SHARDS)).values():
+        counts[owner] = counts.get(owner, 0) + 1
+
+    assert set(counts) == set(SHARDS)
+    for count in counts.values():
+        assert 0.5 * len(KEYS) / len(SHARDS) < count < 1.5 * len(KEYS) / len(SHARDS)
+
+
+def test_adding_a_shard_only_moves_keys_to_it():
+    ring = HashRing(SHARDS[:3])
+    before = _owners(ring)
+    ring.add(SHARDS[3])
+    after = _owners(ring)
+
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == SHARDS[3] for key in moved)
+    # Roughly 1/4 of the keys should move to the new shard
+    assert 0.1 * len(KEYS) < len(moved) < 0.4 * len(KEYS)
+
+
+def test_removing_a_shard_only_moves_its_keys():
+    ring = HashRing(SHARDS)
+    before = _owners(ring)
+    ring.remove(SHARDS[1])
+    after = _owners(ring)
+
+    for key in KEYS:
+        if before[key] == SHARDS[1]:
+            assert after[key] != SHARDS[1]
+        else:
+            assert after[key] == before[key]
+
+
+def test_remove_then_add_restores_ownership():
+    ring = HashRing(SHARDS)
+    before = _owners(ring)
+    ring.remove(SHARDS[2])
+    ring.add(SHARDS[2])
+    assert _owners(ring) == before
+
+
+def test_keyless_traffic_round_robins_and_empty_ring_has_no_owner():
+    ring = HashRing(SHARDS[:2])
+    assert [ring.owner(None) for _ in range(4)] == [SHARDS[0], SHARDS[1], SHARDS[0], SHARDS[1]]
+    assert HashRing().owner("room_1") is None
+
+
+def test_shard_key_prefers_conversation_then_room_then_user():
+    assert shard_key({"conversation_id": "c", "room_id": "r", "user_id": "u"}) == "c"
+    assert shard_key({"room_id": "r", "user_id": "u"}) == "r"
+    assert shard_key({"user_id": "u"}) == "u"
+    assert shard_key([{"conversation_id": "old"}, {"conversation_id": "new"}]) == "new"
+    assert shard_key([]) is None
+    assert shard_key("text") is None
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for near-duplicate verdict reuse, with a fixed embedding table instead of the model
+"""
+
+import os
+import sys
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from risk.verdict_index import VerdictIndex
+
+# Unit-ish vectors: paraphrases point the same way, unrelated messages do not
+EMBEDDINGS = {
+    "send me a pic": [1.0, 0.0, 0.0, 0.0],
+    "send me ur pic pls": [0.98, 0.2, 0.0, 0.0],
+    "how old are you": [0.0, 1.0, 0.0, 0.0],
+    "gg nice shot": [0.0, 0.0, 1.0, 0.0],
+    "want to team up?": [0.0, 0.0, 0.95, 0.3],
+    "where do you live": [0.0, 0.0, 0.0, 1.0],
+}
+KEY = ("stable", ("Image request",))
+
+
+def _index(**kwargs) -> VerdictIndex:
+    kwargs.setdefault("audit_rate", 0.0)
+    return VerdictIndex(embed_fn=lambda text: np.array(EMBEDDINGS[text], dtype=np.float32), **kwargs)
+
+
+def _add(index: VerdictIndex, message: str, context: str = None, key=KEY, risk: str = "HIGH", score: float = 0.85):
+    context_embedding = index.embed(context) if context else None
+    index.add(index.embed(message), context_embedding, key, risk, score, f"verdict for {message}")
+
+
+def test_paraphrase_within_threshold_reuses_verdict():
+    index = _index()
+    _add(index, "send me a pic")
+
+    match = index.search(index.embed("send me ur pic pls"), None, KEY)
+    assert match is not None
+    assert (match.llm_risk, match.llm_score) == ("HIGH", 0.85)
+    assert match.similarity >= 0.92
+    assert index.search(index.embed("how old are you"), None, KEY) is None
+
+    strict = _index(similarity=0.999)
+    _add(strict, "send me a pic")
+    assert strict.search(strict.embed("send me ur pic pls"), None, KEY) is None
+
+    stats = index.get_stats()
+    assert (stats["lookups"], stats["hits"], stats["hit_rate"]) == (2, 1, 0.5)
+
+
+def test_context_must_match():
+    index = _index()
+    _add(index, "send me a pic", context="gg nice shot")
+    query = index.embed("send me ur pic pls")
+
+    # Different pattern set or trend
+    assert index.search(query, index.embed("gg nice shot"), ("escalating", ("Image request",))) is None
+    # Similar and dissimilar recent messages
+    assert index.search(query, index.embed("want to team up?"), KEY) is not None
+    assert index.search(query, index.embed("where do you live"), KEY) is None
+    # A verdict judged mid-conversation does not apply to a conversation opener, and vice versa
+    assert index.search(query, None, KEY) is None
+    opener = _index()
+    _add(opener, "send me a pic")
+    assert opener.search(query, opener.embed("gg nice shot"), KEY) is None
+
+
+def test_expired_verdicts_are_ignored():
+    index = _index(ttl=60)
+    _add(index, "send me a pic")
+    index._added_at[0] -= 120
+
+    assert index.search(index.embed("send me a pic"), None, KEY) is None
+
+
+def test_oldest_verdicts_are_evicted_when_full():
+    index = _index(capacity=2)
+    for message in ("send me a pic", "how old are you", "where do you live"):
+        _add(index, message)
+
+    stats = index.get_stats()
+    assert (stats["size"], stats["evictions"]) == (2, 1)
+    assert index.search(index.embed("send me a pic"), None, KEY) is None
+    assert index.search(index.embed("where do you live"), None, KEY).explanation == "verdict for where do you live"
+
+
+def test_short_messages_are_not_accepted():
+    index = _index(min_words=3)
+    assert not index.accepts("13")
+    assert not index.accepts("sure where?")
+    assert index.accepts("send me a pic")
+
+
+def test_audit_counters():
+    assert not _index(audit_rate=0.0).should_audit()
+    assert _index(audit_rate=1.0).should_audit()
+
+    index = _index()
+    _add(index, "send me a pic", score=0.8)
+    match = index.search(index.embed("send me ur pic pls"), None, KEY)
+    index.record_audit(match, "HIGH", 0.9)
+    index.record_audit(match, "MEDIUM", 0.5)
+
+    stats = index.get_stats()
+    assert stats["audits"] == 2
+    assert stats["audit_level_agreement"] == 0.5
+    assert abs(stats["audit_mean_abs_score_diff"] - 0.2) < 1e-9